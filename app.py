@@ -1,20 +1,26 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory, redirect, url_for, flash
+from flask import Flask, request, jsonify, render_template, send_from_directory, redirect, url_for, flash, Response, stream_with_context
 import os
-import random
+import time
+import threading
 import uuid
-from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from functools import wraps
-from dotenv import load_dotenv
-
-load_dotenv()
+import json
+import base64
+import hmac
+from datetime import datetime, timezone
+import config  # noqa: F401  # loads .env
+
+import metrics
+from perf_queue import PerformanceWriteQueue, register_shutdown_flush
+from storage import get_storage, StorageError, IntegrityError, DataError
+from completed_cache import CompletedSetCache, random_unseen
+from hashing import hash_password, verify_password, HashingBusy
+from export_performance import export_chunks, parse_bound, EXPORT_FORMATS
+from eval_jobs import get_job_queue, JobQueueFull
 
 # Import module functions
 from moduleA import run_moduleA, sentences as moduleA_sentences
-from moduleB import run_moduleB, sentences as moduleB_sentences, generate_audio_for_sentence
-from moduleC import run_moduleC, topics
+from moduleB import run_moduleB, sentences as moduleB_sentences, generate_audio_for_sentence, resolve_voice, resolve_rate
+from moduleC import run_moduleC, stream_moduleC, topics
 from moduleD import get_quiz, submit_answers
 
 app = Flask(__name__)
@@ -22,183 +28,160 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'temp_audio'
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-change-me-in-production')
 
+PERFORMANCE_WRITE_BEHIND = os.getenv('PERFORMANCE_WRITE_BEHIND', '1') != '0'
+
 # Create temp directory if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 
-# ===== DATABASE FUNCTIONS =====
-
-def get_db_connection():
-    """Get database connection"""
-    try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'))
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
-
 # ===== USER MANAGEMENT FUNCTIONS =====
+# All persistence goes through the configured storage backend (storage.py)
+
+storage = get_storage()
 
 def create_user(email, username, password):
-    """Create a new user account"""
-    conn = get_db_connection()
-    if not conn:
-        return False, "Database connection failed"
+    """Create a new user account
+
+    Raises HashingBusy when the hashing pool is saturated.
+    """
+    password_hash = hash_password(password)
     try:
-        cur = conn.cursor()
-        cur.execute("INSERT INTO users (email, username, password_hash) VALUES (%s, %s, %s)",
-                    (email.lower().strip(), username.strip(), generate_password_hash(password)))
-        conn.commit()
-        cur.close()
+        storage.create_user(email.lower().strip(), username.strip(), password_hash)
         return True, None
-    except psycopg2.IntegrityError:
-        conn.rollback()
+    except IntegrityError:
         return False, "Email already registered"
-    except Exception as e:
-        conn.rollback()
+    except StorageError as e:
         return False, str(e)
-    finally:
-        conn.close()
 
 
 def verify_user(email, password):
-    """Verify user credentials"""
-    conn = get_db_connection()
-    if not conn:
-        return False, "Database connection failed"
+    """Verify user credentials
+
+    Hashes made with outdated parameters are upgraded on success.
+    Raises HashingBusy when the hashing pool is saturated.
+    """
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT id, email, username, password_hash FROM users WHERE email = %s", 
-                   (email.lower().strip(),))
-        row = cur.fetchone()
-        
-        if not row:
-            return False, "Invalid credentials"
-        if not check_password_hash(row["password_hash"], password):
-            return False, "Invalid credentials"
-            
-        user_data = {"id": row["id"], "email": row["email"], "username": row["username"]}
-        cur.close()
-        return True, user_data
-    except Exception as e:
+        row = storage.get_user(email.lower().strip(), include_password=True)
+    except StorageError as e:
         print(f"Verify user error: {e}")
         return False, str(e)
-    finally:
-        conn.close()
+
+    if not row:
+        return False, "Invalid credentials"
+    valid, upgraded_hash = verify_password(row["password_hash"], password)
+    if not valid:
+        return False, "Invalid credentials"
+    if upgraded_hash:
+        try:
+            storage.update_password_hash(row["id"], upgraded_hash)
+        except StorageError as e:
+            print(f"Password rehash error: {e}")
+        
+    user_data = {"id": row["id"], "email": row["email"], "username": row["username"]}
+    return True, user_data
 
 def get_user_by_email(email):
     """Get user details by email"""
-    conn = get_db_connection()
-    if not conn:
-        return None
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT id, email, username FROM users WHERE email = %s", 
-                   (email.lower().strip(),))
-        row = cur.fetchone()
-        cur.close()
-        return row
-    except Exception as e:
+        return storage.get_user(email.lower().strip())
+    except StorageError as e:
         print(f"Get user error: {e}")
         return None
-    finally:
-        conn.close()
 
 
 # ===== PERFORMANCE TRACKING FUNCTIONS =====
 
-def save_performance(user_id, session_id, module, question_number, score, max_score):
-    """Save performance data for a question"""
-    conn = get_db_connection()
-    if not conn:
-        return
+def write_performance_rows(rows):
+    """Insert user_performance rows (and their rollups) in one transaction
+
+    Args:
+        rows: (user_id, session_id, module, question_number, score, max_score, timestamp) tuples
+
+    Raises on failure so the write-behind queue can spool the batch.
+    """
+    storage.write_performance_rows(rows)
+
+
+# Scores are written behind the request by a background flusher; rows that
+# cannot reach the database are spooled locally and replayed on recovery.
+performance_queue = PerformanceWriteQueue(
+    write_performance_rows,
+    spool_path=os.getenv('PERFORMANCE_SPOOL_PATH', 'performance_spool.db'),
+    batch_size=int(os.getenv('PERFORMANCE_FLUSH_BATCH', '100')),
+    flush_interval=float(os.getenv('PERFORMANCE_FLUSH_INTERVAL', '0.5')),
+    # Rows the database rejects are dead-lettered instead of blocking the spool
+    permanent_errors=(DataError, IntegrityError),
+)
+register_shutdown_flush(performance_queue)
+
+# Module A/B/C evaluations submitted with "async": true run on this bounded pool
+evaluation_jobs = get_job_queue()
+JOB_MAX_WAIT = float(os.getenv('EVAL_JOB_MAX_WAIT', '25'))
+
+# Per-(user, module) completed-question bitsets used to pick unseen items
+completed_cache = CompletedSetCache(ttl=float(os.getenv('COMPLETED_CACHE_TTL', '300')))
+
+
+def save_performance_batch(user_id, session_id, module, items):
+    """Save every scored item of one submission
+
+    Args:
+        items: iterable of (question_number, score, max_score) tuples
+
+    Rows are stamped now and handed to the write-behind queue, so the request
+    never waits on the database. Set PERFORMANCE_WRITE_BEHIND=0 to write inline
+    as a single multi-row INSERT instead.
+    """
+    recorded_at = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(sep=' ')
+    rows = [(user_id, session_id, module, question_number, score, max_score, recorded_at)
+            for question_number, score, max_score in items]
+    if not rows:
+        return True
+    completed_cache.mark(user_id, module, [row[3] for row in rows])
+    if PERFORMANCE_WRITE_BEHIND:
+        performance_queue.enqueue(rows)
+        return True
     try:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO user_performance (user_id, session_id, module, question_number, score, max_score)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (user_id, session_id, module, question_number, score, max_score))
-        conn.commit()
-        cur.close()
+        write_performance_rows(rows)
+        return True
     except Exception as e:
         print(f"Error saving performance: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
-
-def get_completed_questions(user_id, module_name):
-    """Get list of question numbers already completed by user for a specific module"""
-    conn = get_db_connection()
-    if not conn:
-        return []
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT DISTINCT question_number FROM user_performance
-            WHERE user_id = %s AND module = %s
-        """, (user_id, module_name))
-        rows = cur.fetchall()
-        cur.close()
-        return [row[0] for row in rows]
-    except Exception as e:
-        print(f"Error getting completed questions: {e}")
-        return []
-    finally:
-        conn.close()
-
+        return False
 
 def get_session_report(user_id, session_id):
     """Generate comprehensive performance report"""
-    conn = get_db_connection()
-    if not conn:
-        return {'modules': [], 'overall_score': 0, 'total_questions': 0}
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get all performance data for this session grouped by module
-        cur.execute("""
-            SELECT module, AVG(score) as avg_score, AVG(max_score) as max_score, COUNT(*) as attempts
-            FROM user_performance
-            WHERE user_id = %s AND session_id = %s
-            GROUP BY module
-            ORDER BY module
-        """, (user_id, session_id))
-        
-        results = cur.fetchall()
-        cur.close()
-        
-        report = {
-            'modules': [],
-            'overall_score': 0,
-            'total_questions': 0
-        }
-        
-        total_percentage = 0
-        module_count = 0
-        
-        for row in results:
-            percentage = round((row['avg_score'] / row['max_score'] * 100) if row['max_score'] > 0 else 0, 1)
-            module_data = {
-                'name': row['module'],
-                'average_score': round(row['avg_score'], 2),
-                'max_score': round(row['max_score'], 2),
-                'percentage': percentage,
-                'questions_completed': row['attempts']
-            }
-            report['modules'].append(module_data)
-            total_percentage += percentage
-            module_count += 1
-            report['total_questions'] += row['attempts']
-        
-        report['overall_score'] = round(total_percentage / module_count if module_count > 0 else 0, 1)
-        
-        return report
-        
-    except Exception as e:
+        results = storage.session_report(user_id, session_id)
+    except StorageError as e:
         print(f"Error generating report: {e}")
         return {'modules': [], 'overall_score': 0, 'total_questions': 0}
-    finally:
-        conn.close()
+
+    report = {
+        'modules': [],
+        'overall_score': 0,
+        'total_questions': 0
+    }
+    
+    total_percentage = 0
+    module_count = 0
+    
+    for row in results:
+        percentage = round((row['avg_score'] / row['max_score'] * 100) if row['max_score'] > 0 else 0, 1)
+        module_data = {
+            'name': row['module'],
+            'average_score': round(row['avg_score'], 2),
+            'max_score': round(row['max_score'], 2),
+            'percentage': percentage,
+            'questions_completed': row['attempts']
+        }
+        report['modules'].append(module_data)
+        total_percentage += percentage
+        module_count += 1
+        report['total_questions'] += row['attempts']
+    
+    report['overall_score'] = round(total_percentage / module_count if module_count > 0 else 0, 1)
+    
+    return report
 
 
 # ===== AUTHENTICATION DECORATOR REMOVED =====
@@ -206,6 +189,17 @@ def get_session_report(user_id, session_id):
 
 # ===== AUTHENTICATION ROUTES =====
 
+def _busy_response(msg, endpoint):
+    """Fast 503 while password hashing is saturated, so clients back off and retry"""
+    if request.is_json:
+        response = jsonify({'success': False, 'error': msg})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    flash(msg, 'error')
+    return redirect(url_for(endpoint))
+
+
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
     """Handle user signup"""
@@ -224,7 +218,10 @@ def signup():
         flash(msg, 'error')
         return redirect(url_for('signup'))
 
-    ok, err = create_user(email, username, password)
+    try:
+        ok, err = create_user(email, username, password)
+    except HashingBusy as e:
+        return _busy_response(str(e), 'signup')
     if not ok:
         if request.is_json:
             return jsonify({'success': False, 'error': err}), 400
@@ -254,7 +251,10 @@ def login():
         flash(msg, 'error')
         return redirect(url_for('login'))
 
-    ok, user = verify_user(email, password)
+    try:
+        ok, user = verify_user(email, password)
+    except HashingBusy as e:
+        return _busy_response(str(e), 'login')
     if not ok:
         if request.is_json:
             return jsonify({'success': False, 'error': user}), 401
@@ -331,116 +331,217 @@ def static_files(filename):
 
 # ===== API ENDPOINTS - GET CONTENT =====
 
-@app.route('/api/moduleA/sentence', methods=['GET'])
-def get_moduleA_sentence():
-    """Get a random sentence for Module A - Read & Speak"""
+def resolve_user_and_completed(email, module_name):
+    """Look up a user and their completed questions for a module in one round trip
+
+    Returns (user_id, completed_mask); user_id is None for unknown emails.
+    Served entirely from the in-process caches when both are warm.
+    """
+    email = email.lower().strip()
+    user_id = completed_cache.user_id_for(email)
+    if user_id is not None:
+        mask = completed_cache.get(user_id, module_name)
+        if mask is not None:
+            return user_id, mask
+
+    try:
+        row = storage.user_and_completed(email, module_name)
+    except StorageError as e:
+        print(f"Error resolving user and completed questions: {e}")
+        return None, 0
+
+    if not row:
+        return None, 0
+    user_id, completed = row
+    completed_cache.remember_user(email, user_id)
+    return user_id, completed_cache.load(user_id, module_name, completed)
+
+
+def _moduleA_item(completed_mask):
+    sentence_id = random_unseen(completed_mask, len(moduleA_sentences))
+    return {
+        'sentence_id': sentence_id,
+        'sentence': moduleA_sentences[sentence_id],
+        'success': True
+    }
+
+
+def _moduleB_item(completed_mask):
+    # ?voice= and ?rate= pick the rendering; unsupported values raise ValueError (400)
+    voice = resolve_voice(request.args.get('voice'))
+    rate = resolve_rate(request.args.get('rate'))
+    sentence_id = random_unseen(completed_mask, len(moduleB_sentences))
+    return {
+        'sentence_id': sentence_id,
+        'sentence': moduleB_sentences[sentence_id],
+        # Generate audio
+        'audio_url': generate_audio_for_sentence(sentence_id, voice=voice, rate=rate),
+        'voice': voice,
+        'rate': rate,
+        'success': True
+    }
+
+
+def _moduleC_item(completed_mask):
+    topic_id = random_unseen(completed_mask, len(topics))
+    return {
+        'topic_id': topic_id,
+        'topic': topics[topic_id],
+        'success': True
+    }
+
+
+def _moduleD_item(completed_mask):
+    return get_quiz(num_questions=5, completed_mask=completed_mask)
+
+
+# module key -> (module name stored in user_performance, item builder)
+NEXT_ITEM_MODULES = {
+    'moduleA': ('Module A - Read & Speak', _moduleA_item),
+    'moduleB': ('Module B - Listen & Repeat', _moduleB_item),
+    'moduleC': ('Module C - Topic Speaking', _moduleC_item),
+    'moduleD': ('Module D - Grammar Quiz', _moduleD_item),
+}
+
+
+@app.route('/api/next/<module_key>', methods=['GET'])
+def next_item(module_key):
+    """Get the next unseen item for any module"""
+    if module_key not in NEXT_ITEM_MODULES:
+        return jsonify({'error': 'Unknown module', 'success': False}), 404
     try:
+        module_name, build_item = NEXT_ITEM_MODULES[module_key]
         email = request.args.get('email')
-        
-        available_indices = list(range(len(moduleA_sentences)))
-        
+
+        completed_mask = 0
         if email:
-            user = get_user_by_email(email)
-            if user:
-                completed = get_completed_questions(user['id'], 'Module A - Read & Speak')
-                filtered = [i for i in available_indices if i not in completed]
-                if filtered:
-                    available_indices = filtered
-        
-        sentence_id = random.choice(available_indices)
-        sentence = moduleA_sentences[sentence_id]
-        return jsonify({
-            'sentence_id': sentence_id,
-            'sentence': sentence,
-            'success': True
-        })
+            _, completed_mask = resolve_user_and_completed(email, module_name)
+
+        return jsonify(build_item(completed_mask))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
     except Exception as e:
-        print(f"Error in moduleA/sentence: {str(e)}")
+        print(f"Error in {module_key} next item: {str(e)}")
         return jsonify({'error': str(e), 'success': False}), 500
 
 
+@app.route('/api/moduleA/sentence', methods=['GET'])
+def get_moduleA_sentence():
+    """Get a random sentence for Module A - Read & Speak"""
+    return next_item('moduleA')
+
+
 @app.route('/api/moduleB/sentence', methods=['GET'])
 def get_moduleB_sentence():
     """Get a random sentence for Module B - Listen & Repeat"""
-    try:
-        email = request.args.get('email')
-        
-        available_indices = list(range(len(moduleB_sentences)))
-        
-        if email:
-            user = get_user_by_email(email)
-            if user:
-                completed = get_completed_questions(user['id'], 'Module B - Listen & Repeat')
-                filtered = [i for i in available_indices if i not in completed]
-                if filtered:
-                    available_indices = filtered
-                    
-        sentence_id = random.choice(available_indices)
-        sentence = moduleB_sentences[sentence_id]
-        
-        # Generate audio
-        audio_url = generate_audio_for_sentence(sentence_id)
-        
-        return jsonify({
-            'sentence_id': sentence_id,
-            'sentence': sentence,
-            'audio_url': audio_url,
-            'success': True
-        })
-    except Exception as e:
-        print(f"Error in moduleB/sentence: {str(e)}")
-        return jsonify({'error': str(e), 'success': False}), 500
+    return next_item('moduleB')
 
 
 @app.route('/api/moduleC/topic', methods=['GET'])
 def get_moduleC_topic():
     """Get a random topic for Module C - Topic Speaking"""
-    try:
-        email = request.args.get('email')
-        
-        available_indices = list(range(len(topics)))
-        
-        if email:
-            user = get_user_by_email(email)
-            if user:
-                completed = get_completed_questions(user['id'], 'Module C - Topic Speaking')
-                filtered = [i for i in available_indices if i not in completed]
-                if filtered:
-                    available_indices = filtered
-
-        topic_id = random.choice(available_indices)
-        topic = topics[topic_id]
-        return jsonify({
-            'topic_id': topic_id,
-            'topic': topic,
-            'success': True
-        })
-    except Exception as e:
-        print(f"Error in moduleC/topic: {str(e)}")
-        return jsonify({'error': str(e), 'success': False}), 500
+    return next_item('moduleC')
 
 
 @app.route('/api/moduleD/quiz', methods=['GET'])
 def api_get_quiz():
     """Get a new quiz for Module D"""
-    try:
-        email = request.args.get('email')
-        excluded_indices = []
-        
-        if email:
-            user = get_user_by_email(email)
-            if user:
-                excluded_indices = get_completed_questions(user['id'], 'Module D - Grammar Quiz')
-        
-        quiz = get_quiz(num_questions=5, excluded_indices=excluded_indices)
-        return jsonify(quiz)
-    except Exception as e:
-        print(f"Error in moduleD/quiz: {str(e)}")
-        return jsonify({'error': str(e), 'success': False}), 500
+    return next_item('moduleD')
 
 
 # ===== API ENDPOINTS - SUBMIT AUDIO/ANSWERS =====
 
+def question_id(data, field):
+    """Integer id from the request body, or None if missing or not an integer"""
+    value = data.get(field)
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    return None
+
+
+def evaluate_moduleA(user_id, session_id, sentence_id, transcribed_text, duration):
+    """Score a Module A attempt and record it; runs inline or as a job"""
+    result = run_moduleA(transcribed_text, duration, sentence_id)
+
+    save_performance_batch(
+        user_id=user_id,
+        session_id=session_id or 'unknown',
+        module='Module A - Read & Speak',
+        items=[(sentence_id, result.get('pronunciation_score', 0), 100)]
+    )
+
+    if 'success' not in result:
+        result['success'] = True
+    return result
+
+
+def evaluate_moduleB(user_id, session_id, sentence_id, transcribed_text, duration):
+    """Score a Module B attempt and record it; runs inline or as a job"""
+    try:
+        result = run_moduleB(transcribed_text, sentence_id, duration)
+    except TypeError:
+        # Fallback for legacy calls or if run_moduleB definition hasn't updated yet in memory (shouldn't happen with reloads but safe)
+        result = run_moduleB(transcribed_text, sentence_id)
+
+    save_performance_batch(
+        user_id=user_id,
+        session_id=session_id or 'unknown',
+        module='Module B - Listen & Repeat',
+        items=[(sentence_id, result.get('pronunciation_score', result.get('score', 0)), 100)]
+    )
+
+    if 'success' not in result:
+        result['success'] = True
+    return result
+
+
+def evaluate_moduleC(user_id, session_id, topic_id, transcribed_text):
+    """Score a Module C answer and record it; runs inline or as a job"""
+    result = run_moduleC(transcribed_text, topic_id)
+    result['topic_id'] = topic_id
+
+    save_performance_batch(
+        user_id=user_id,
+        session_id=session_id or 'unknown',
+        module='Module C - Topic Speaking',
+        items=[(topic_id, result.get('score', 0), 100)]
+    )
+
+    if 'success' not in result:
+        result['success'] = True
+    return result
+
+
+def wants_job(data):
+    """Job mode is opted into per request with "async": true or ?async=1"""
+    flag = data.get('async', request.args.get('async'))
+    return flag is True or str(flag).lower() in ('1', 'true', 'yes')
+
+
+def run_or_enqueue(kind, data, fn, *args):
+    """Evaluate inline, or queue the evaluation and answer 202 with a job id.
+
+    Queued evaluations save performance when they finish; clients poll
+    GET /api/jobs/<job_id> (add ?wait=N to hold the request until it's done).
+    """
+    if not wants_job(data):
+        return jsonify(fn(*args))
+    try:
+        job_id = evaluation_jobs.submit(kind, fn, *args)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e), 'success': False}), 503, {'Retry-After': '2'}
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('api_job_status', job_id=job_id),
+    }), 202
+
+
 @app.route('/api/moduleA', methods=['POST'])
 def api_moduleA():
     """Process text for Module A - Read & Speak"""
@@ -451,12 +552,14 @@ def api_moduleA():
 
         email = data.get('email')
         session_id = data.get('session_id')
-        sentence_id = data.get('sentence_id')
+        sentence_id = question_id(data, 'sentence_id')
         transcribed_text = data.get('transcribed_text', '')
         duration = data.get('duration', 0)
 
         if not email:
             return jsonify({'error': 'Email is required', 'success': False}), 400
+        if sentence_id is None:
+            return jsonify({'error': 'sentence_id must be an integer', 'success': False}), 400
         
         user = get_user_by_email(email)
         if not user:
@@ -464,23 +567,8 @@ def api_moduleA():
         
         user_id = user['id']
 
-        # Call moduleA with text
-        result = run_moduleA(transcribed_text, duration, sentence_id)
-
-        # Save performance
-        save_performance(
-            user_id=user_id,
-            session_id=session_id or 'unknown',
-            module='Module A - Read & Speak',
-            question_number=sentence_id,
-            score=result.get('pronunciation_score', 0),
-            max_score=100
-        )
-
-        if 'success' not in result:
-            result['success'] = True
-
-        return jsonify(result)
+        return run_or_enqueue('moduleA', data, evaluate_moduleA,
+                              user_id, session_id, sentence_id, transcribed_text, duration)
 
     except Exception as e:
         print(f"Error in moduleA: {str(e)}")
@@ -497,12 +585,14 @@ def api_moduleB():
 
         email = data.get('email')
         session_id = data.get('session_id')
-        sentence_id = data.get('sentence_id')
+        sentence_id = question_id(data, 'sentence_id')
         transcribed_text = data.get('transcribed_text', '')
         duration = data.get('duration', 0)
 
         if not email:
             return jsonify({'error': 'Email is required', 'success': False}), 400
+        if sentence_id is None:
+            return jsonify({'error': 'sentence_id must be an integer', 'success': False}), 400
             
         user = get_user_by_email(email)
         if not user:
@@ -510,25 +600,8 @@ def api_moduleB():
             
         user_id = user['id']
 
-        try:
-            result = run_moduleB(transcribed_text, sentence_id, duration)
-        except TypeError:
-            # Fallback for legacy calls or if run_moduleB definition hasn't updated yet in memory (shouldn't happen with reloads but safe)
-            result = run_moduleB(transcribed_text, sentence_id)
-
-        save_performance(
-            user_id=user_id,
-            session_id=session_id or 'unknown',
-            module='Module B - Listen & Repeat',
-            question_number=sentence_id,
-            score=result.get('pronunciation_score', result.get('score', 0)),
-            max_score=100
-        )
-
-        if 'success' not in result:
-            result['success'] = True
-
-        return jsonify(result)
+        return run_or_enqueue('moduleB', data, evaluate_moduleB,
+                              user_id, session_id, sentence_id, transcribed_text, duration)
 
     except Exception as e:
         print(f"Error in moduleB: {str(e)}")
@@ -545,11 +618,13 @@ def api_moduleC():
 
         email = data.get('email')
         session_id = data.get('session_id')
-        topic_id = data.get('topic_id')
+        topic_id = question_id(data, 'topic_id')
         transcribed_text = data.get('transcribed_text', '')
 
         if not email:
             return jsonify({'error': 'Email is required', 'success': False}), 400
+        if topic_id is None:
+            return jsonify({'error': 'topic_id must be an integer', 'success': False}), 400
             
         user = get_user_by_email(email)
         if not user:
@@ -557,28 +632,95 @@ def api_moduleC():
             
         user_id = user['id']
 
-        result = run_moduleC(transcribed_text, topic_id)
-        result['topic_id'] = topic_id
-
-        save_performance(
-            user_id=user_id,
-            session_id=session_id or 'unknown',
-            module='Module C - Topic Speaking',
-            question_number=topic_id,
-            score=result.get('score', 0),
-            max_score=100
-        )
-
-        if 'success' not in result:
-            result['success'] = True
-
-        return jsonify(result)
+        return run_or_enqueue('moduleC', data, evaluate_moduleC,
+                              user_id, session_id, topic_id, transcribed_text)
 
     except Exception as e:
         print(f"Error in moduleC: {str(e)}")
         return jsonify({'error': str(e), 'success': False}), 500
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Status of a queued evaluation; `result` holds the module's usual response once done.
+
+    ?wait=N long-polls for up to N seconds (capped at JOB_MAX_WAIT) before answering.
+    """
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), JOB_MAX_WAIT)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds', 'success': False}), 400
+
+    job = evaluation_jobs.wait(job_id, wait) if wait else evaluation_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired', 'success': False}), 404
+    job['success'] = job['status'] != 'failed'
+    return jsonify(job)
+
+
+STREAM_FIRST_EVENT = metrics.Histogram('evaluation_stream_first_score_seconds',
+                                       'Time from request to the first streamed score or feedback event')
+STREAM_TOTAL = metrics.Histogram('evaluation_stream_seconds', 'Time from request to the final streamed result')
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/moduleC/stream', methods=['POST'])
+def api_moduleC_stream():
+    """Module C evaluation over Server-Sent Events.
+
+    Sends `accepted` immediately, then `score` events as sub-scores appear,
+    `feedback` events with incremental text, and a final `result` event
+    carrying the same payload as POST /api/moduleC.
+    """
+    started = time.monotonic()
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'Invalid request data', 'success': False}), 400
+
+    email = data.get('email')
+    session_id = data.get('session_id')
+    topic_id = question_id(data, 'topic_id')
+    transcribed_text = data.get('transcribed_text', '')
+
+    if not email:
+        return jsonify({'error': 'Email is required', 'success': False}), 400
+    if topic_id is None:
+        return jsonify({'error': 'topic_id must be an integer', 'success': False}), 400
+
+    user = get_user_by_email(email)
+    if not user:
+        return jsonify({'error': 'User not found', 'success': False}), 404
+    user_id = user['id']
+
+    def generate():
+        # First bytes go out before the model is even called
+        yield _sse('accepted', {'topic_id': topic_id})
+        first = True
+        for event, payload in stream_moduleC(transcribed_text, topic_id):
+            if event != 'result':
+                if first:
+                    STREAM_FIRST_EVENT.observe(time.monotonic() - started)
+                    first = False
+                yield _sse(event, payload)
+                continue
+            payload['topic_id'] = topic_id
+            if payload.get('success'):
+                save_performance_batch(
+                    user_id=user_id,
+                    session_id=session_id or 'unknown',
+                    module='Module C - Topic Speaking',
+                    items=[(topic_id, payload.get('score', 0), 100)]
+                )
+            STREAM_TOTAL.observe(time.monotonic() - started)
+            yield _sse('result', payload)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/moduleD/submit', methods=['POST'])
 def api_submit_quiz():
     """Submit quiz answers for Module D"""
@@ -603,15 +745,16 @@ def api_submit_quiz():
         result = submit_answers(data['answers'])
 
         if result.get('review'):
-            for item in result['review']:
-                save_performance(
-                    user_id=user_id,
-                    session_id=session_id or 'unknown',
-                    module='Module D - Grammar Quiz',
-                    question_number=item.get('question_id', 0), # Use bank ID which is question_id
-                    score=100 if item.get('correct') else 0,
-                    max_score=100
-                )
+            # One multi-row insert for the whole quiz instead of one per question
+            save_performance_batch(
+                user_id=user_id,
+                session_id=session_id or 'unknown',
+                module='Module D - Grammar Quiz',
+                items=[(item.get('question_id', 0), # Use bank ID which is question_id
+                        100 if item.get('correct') else 0,
+                        100)
+                       for item in result['review']]
+            )
 
         if 'success' not in result:
             result['success'] = True
@@ -622,6 +765,12 @@ def api_submit_quiz():
         print(f"Error in moduleD/submit: {str(e)}")
         return jsonify({'error': str(e), 'success': False}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/report', methods=['GET'])
 def api_report():
     """Get performance report"""
@@ -638,5 +787,186 @@ def api_report():
     report = get_session_report(user['id'], session_id or 'unknown')
     return jsonify(report)
 
+HISTORY_CHUNK_SIZE = 500
+HISTORY_MAX_LIMIT = 50000
+
+
+def encode_history_cursor(timestamp, row_id):
+    raw = json.dumps([str(timestamp), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_history_cursor(cursor):
+    """(timestamp, id) from an opaque cursor; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return str(timestamp), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _history_point(row):
+    max_score = row['max_score'] or 0
+    return {
+        'id': row['id'],
+        'timestamp': str(row['timestamp']),
+        'session_id': row['session_id'],
+        'module': row['module'],
+        'question_number': row['question_number'],
+        'score': row['score'],
+        'max_score': row['max_score'],
+        'percentage': round((row['score'] or 0) / max_score * 100, 1) if max_score > 0 else 0
+    }
+
+
+@app.route('/api/history', methods=['GET'])
+def api_history():
+    """Cross-session progress history as time series points, oldest first
+
+    Query params: email (required), module, limit, cursor (from next_cursor).
+    Pages use keyset pagination on (timestamp, id), and the body is streamed:
+    rows are fetched and written in chunks, so even a large page never sits
+    in server memory at once. next_cursor is null on the last page.
+
+    Points are one flat, time-ordered list, each tagged with its module;
+    pass ?module= for a single module's series. Grouping by module here would
+    mean buffering the page or ordering by module, which breaks the cursor.
+    """
+    email = request.args.get('email')
+    module = request.args.get('module') or None
+    if not email:
+        return jsonify({'error': 'Email required'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 1000)), 1), HISTORY_MAX_LIMIT)
+        after = decode_history_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    user = get_user_by_email(email)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    user_id = user['id']
+
+    def generate():
+        yield '{"module": %s, "points": [' % json.dumps(module)
+        cursor = after
+        remaining = limit
+        first = True
+        more = False
+        error = None
+        while remaining > 0:
+            # The last chunk asks for one row past the page to learn whether another page exists
+            want = remaining + 1 if remaining <= HISTORY_CHUNK_SIZE else HISTORY_CHUNK_SIZE
+            try:
+                rows = storage.performance_history(user_id, module=module, after=cursor, limit=want)
+            except StorageError as e:
+                print(f"Error streaming history: {e}")
+                error = str(e)
+                break
+            more = len(rows) > remaining
+            rows = rows[:remaining]
+            if not rows:
+                break
+            chunk = ','.join(json.dumps(_history_point(row)) for row in rows)
+            yield chunk if first else ',' + chunk
+            first = False
+            remaining -= len(rows)
+            cursor = (str(rows[-1]['timestamp']), rows[-1]['id'])
+            if len(rows) < want:
+                # Short chunk: there is nothing further
+                break
+        next_cursor = encode_history_cursor(*cursor) if more and error is None else None
+        tail = {'next_cursor': next_cursor, 'success': error is None}
+        if error:
+            tail['error'] = error
+        yield '], ' + json.dumps(tail)[1:]
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+# ===== ADMIN ENDPOINTS =====
+
+def _is_admin_request():
+    """Admin endpoints are enabled only when ADMIN_TOKEN is set and presented"""
+    token = os.getenv('ADMIN_TOKEN')
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(token) and hmac.compare_digest(supplied, token)
+
+
+@app.route('/api/admin/export', methods=['GET'])
+def admin_export():
+    """Stream user_performance as CSV or NDJSON for grading audits
+
+    Query params: format (csv|ndjson), start, end (ISO dates, end exclusive), module.
+    """
+    if not _is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+    try:
+        start = parse_bound(request.args.get('start'))
+        end = parse_bound(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    module = request.args.get('module') or None
+
+    def generate():
+        try:
+            yield from export_chunks(storage, fmt, start, end, module)
+        except StorageError as e:
+            # Headers are already sent; all we can do is log and end the stream
+            print(f"Error streaming export: {e}")
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"user_performance.{'csv' if fmt == 'csv' else 'ndjson'}"
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+# ===== STARTUP =====
+
+def warm_up():
+    """Pay the one-off costs deferred at import (Gemini client, TTS library,
+    database pool) before the first request needs them.
+
+    Runs in the background at import when WARMUP_ON_START=1; servers can also
+    call it from a post-fork hook.
+    """
+    started = time.monotonic()
+    try:
+        import llm_utils
+        llm_utils.warm_up()
+        import edge_tts  # noqa: F401
+        storage.warm_up()
+    except Exception as e:
+        print(f"Warm-up error: {e}")
+    print(f"Warm-up finished in {time.monotonic() - started:.2f}s")
+
+
+def pregenerate_audio():
+    """Render any missing Module B audio so /api/moduleB/sentence never waits on Edge TTS"""
+    try:
+        import tts_pregen
+        tts_pregen.report(tts_pregen.pregenerate())
+    except Exception as e:
+        print(f"TTS pre-generation error: {e}")
+
+
+def start_background_tasks():
+    """Start the opt-in start-up work (WARMUP_ON_START, TTS_PREGENERATE_ON_START)"""
+    if os.getenv('WARMUP_ON_START') == '1':
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    if os.getenv('TTS_PREGENERATE_ON_START') == '1':
+        threading.Thread(target=pregenerate_audio, name='tts-pregenerate', daemon=True).start()
+
+
+# Spawned helper processes (the password-hashing pool) re-import this file as
+# __mp_main__ when it is run directly; only the server process starts them.
+if __name__ != '__mp_main__':
+    start_background_tasks()
+
+
+# Prefer `python run.py`: it keeps hash workers from re-importing this module
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
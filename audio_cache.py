@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+import metrics
+
+AUDIO_CACHE_LOOKUPS = metrics.Counter('audio_cache_lookups_total', 'TTS audio cache lookups by result',
+                                      labels=('result',))
+AUDIO_CACHE_EVICTIONS = metrics.Counter('audio_cache_evictions_total', 'TTS audio files evicted from the cache',
+                                        labels=('reason',))
+
+# Anything smaller than this can't be a rendered sentence
+MIN_AUDIO_BYTES = 512
+
+
+def audio_cache_key(text, voice, rate, pitch):
+    """Content address of one rendering: editing the text or changing the voice, rate or pitch gives a new key"""
+    raw = json.dumps([" ".join((text or "").split()), voice, rate, pitch], separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_valid_audio(filepath):
+    """True when filepath holds a plausible MP3 (non-trivial size, ID3 tag or MPEG frame sync)"""
+    try:
+        if os.path.getsize(filepath) < MIN_AUDIO_BYTES:
+            return False
+        with open(filepath, 'rb') as f:
+            head = f.read(3)
+    except OSError:
+        return False
+    return head.startswith(b'ID3') or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0)
+
+
+class AudioCache:
+    """Content-addressed MP3 files in `folder`, indexed in a SQLite file.
+
+    Files are named <key>.mp3. The index records each file's size and last
+    access; once the files exceed `max_bytes` the least recently used are
+    deleted until usage is back under 90% of the budget. Files accessed in
+    the last `min_age` seconds are never evicted, so a URL just handed to a
+    client stays fetchable.
+    """
+
+    def __init__(self, folder="static/audio", index_path="audio_cache.db", max_bytes=256 * 1024 * 1024, min_age=300):
+        self.folder = folder
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_pid = None
+
+    # ----- public API -----
+
+    def path_for(self, key):
+        return os.path.join(self.folder, f"{key}.mp3")
+
+    def lookup(self, key):
+        """Path of the cached file for key (marking it used), or None"""
+        filepath = self.path_for(key)
+        if not is_valid_audio(filepath):
+            with self._lock:
+                self._forget(key)
+            AUDIO_CACHE_LOOKUPS.inc(result="miss")
+            return None
+        with self._lock:
+            self._touch(key, filepath)
+        AUDIO_CACHE_LOOKUPS.inc(result="hit")
+        return filepath
+
+    def contains(self, key):
+        """Like lookup() without counting a hit or refreshing the entry's recency"""
+        return is_valid_audio(self.path_for(key))
+
+    def record(self, key, text, voice, rate, pitch):
+        """Index a file just written to path_for(key), then evict if over budget"""
+        filepath = self.path_for(key)
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute("""
+                    INSERT OR REPLACE INTO audio_cache (key, text, voice, rate, pitch, size, created_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (key, text, voice, rate, pitch, os.path.getsize(filepath), now, now))
+                self._evict(db, now)
+                db.commit()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Audio cache index error: {e}")
+
+    def stats(self):
+        hits = AUDIO_CACHE_LOOKUPS.value(result="hit")
+        misses = AUDIO_CACHE_LOOKUPS.value(result="miss")
+        try:
+            with self._lock:
+                files, used = self._db().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM audio_cache").fetchone()
+        except sqlite3.Error:
+            files, used = 0, 0
+        return {
+            "files": files,
+            "bytes": used,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
+    # ----- index -----
+
+    def _db(self):
+        if self._index is None or self._index_pid != os.getpid():
+            conn = sqlite3.connect(self.index_path, check_same_thread=False, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS audio_cache (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    voice TEXT NOT NULL,
+                    rate TEXT NOT NULL,
+                    pitch TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audio_cache_accessed ON audio_cache (accessed_at)")
+            conn.commit()
+            self._index = conn
+            self._index_pid = os.getpid()
+        return self._index
+
+    def _touch(self, key, filepath):
+        try:
+            db = self._db()
+            cur = db.execute("UPDATE audio_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            if cur.rowcount == 0:
+                # A valid file the index doesn't know (index reset, files copied in): adopt it
+                now = time.time()
+                db.execute("""
+                    INSERT OR IGNORE INTO audio_cache (key, text, voice, rate, pitch, size, created_at, accessed_at)
+                    VALUES (?, '', '', '', '', ?, ?, ?)
+                """, (key, os.path.getsize(filepath), now, now))
+            db.commit()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Audio cache index error: {e}")
+
+    def _forget(self, key):
+        try:
+            db = self._db()
+            db.execute("DELETE FROM audio_cache WHERE key = ?", (key,))
+            db.commit()
+        except sqlite3.Error as e:
+            print(f"Audio cache index error: {e}")
+
+    def _evict(self, db, now):
+        """Delete least-recently-used files until back under 90% of the budget"""
+        # Summed from the index each time: several worker processes share it
+        used = db.execute("SELECT COALESCE(SUM(size), 0) FROM audio_cache").fetchone()[0]
+        if used <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        victims = db.execute("SELECT key, size FROM audio_cache WHERE accessed_at < ? ORDER BY accessed_at",
+                             (now - self.min_age,)).fetchall()
+        for victim_key, size in victims:
+            if used <= target:
+                break
+            try:
+                os.remove(self.path_for(victim_key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Audio cache eviction error: {e}")
+                continue
+            db.execute("DELETE FROM audio_cache WHERE key = ?", (victim_key,))
+            used -= size
+            AUDIO_CACHE_EVICTIONS.inc(reason="size")
@@ -0,0 +1,144 @@
+import time
+import random
+import threading
+from collections import OrderedDict
+
+import metrics
+
+CACHE_HITS = metrics.Counter('completed_cache_hits_total', 'Completed-set lookups served from the in-process bitset cache')
+CACHE_MISSES = metrics.Counter('completed_cache_misses_total', 'Completed-set lookups that had to query the database')
+
+# Question banks are small; anything beyond this is not a bank index and would only bloat the bitset
+MAX_INDEX = 4096
+
+
+def to_mask(question_numbers):
+    """Pack question indices into an int bitset; invalid or negative entries are ignored"""
+    mask = 0
+    for n in question_numbers:
+        try:
+            n = int(n)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= n < MAX_INDEX:
+            mask |= 1 << n
+    return mask
+
+
+def mask_to_indices(mask):
+    indices = []
+    while mask:
+        low = mask & -mask
+        indices.append(low.bit_length() - 1)
+        mask ^= low
+    return indices
+
+
+def _nth_set_bit(mask, n):
+    while n:
+        mask &= mask - 1
+        n -= 1
+    return (mask & -mask).bit_length() - 1
+
+
+def random_unseen(mask, size, rng=random):
+    """Pick a random index in [0, size) whose bit is clear in `mask`.
+
+    When every item has been seen, any index may be returned (same as the old
+    behaviour of falling back to the whole bank).
+    """
+    unseen = ((1 << size) - 1) & ~mask
+    if not unseen:
+        return rng.randrange(size)
+    # A few blind probes are enough while most of the bank is unseen
+    for _ in range(8):
+        i = rng.randrange(size)
+        if unseen >> i & 1:
+            return i
+    return _nth_set_bit(unseen, rng.randrange(bin(unseen).count("1")))
+
+
+def sample_unseen(mask, size, k, rng=random):
+    """Pick up to k distinct unseen indices, falling back to the whole bank once exhausted"""
+    unseen = ((1 << size) - 1) & ~mask
+    if not unseen:
+        unseen = (1 << size) - 1
+    return rng.sample(mask_to_indices(unseen), min(k, bin(unseen).count("1")))
+
+
+class CompletedSetCache:
+    """In-process cache of which questions each user has completed per module.
+
+    Each (user_id, module) maps to an int bitset. Entries loaded from the
+    database are authoritative until they expire; writes made through this
+    process are OR-ed in immediately (even before the write-behind queue has
+    flushed them), so the next pick never repeats an item just answered.
+    Entries expire after `ttl` seconds to pick up writes made by other workers.
+    """
+
+    def __init__(self, max_entries=50000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._user_ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def user_id_for(self, email):
+        """Cached user id for a normalised email, or None"""
+        with self._lock:
+            user_id = self._user_ids.get(email)
+            if user_id is not None:
+                self._user_ids.move_to_end(email)
+            return user_id
+
+    def remember_user(self, email, user_id):
+        with self._lock:
+            self._user_ids[email] = user_id
+            self._user_ids.move_to_end(email)
+            while len(self._user_ids) > self.max_entries:
+                self._user_ids.popitem(last=False)
+
+    def get(self, user_id, module):
+        """Return the cached bitset, or None if it must be loaded from the database"""
+        key = (user_id, module)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry[1] or time.monotonic() - entry[2] > self.ttl:
+                CACHE_MISSES.inc()
+                return None
+            self._entries.move_to_end(key)
+            CACHE_HITS.inc()
+            return entry[0]
+
+    def load(self, user_id, module, question_numbers):
+        """Store the database's completed set, merged with any locally recorded bits"""
+        key = (user_id, module)
+        mask = to_mask(question_numbers)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                mask |= entry[0]
+            self._entries[key] = (mask, True, time.monotonic())
+            self._entries.move_to_end(key)
+            self._evict()
+        return mask
+
+    def mark(self, user_id, module, question_numbers):
+        """Record newly completed questions for this user"""
+        key = (user_id, module)
+        bits = to_mask(question_numbers)
+        if not bits:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Not loaded yet: keep the bits so a later load cannot miss unflushed writes
+                self._entries[key] = (bits, False, time.monotonic())
+            else:
+                self._entries[key] = (entry[0] | bits, entry[1], entry[2])
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
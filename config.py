@@ -0,0 +1,5 @@
+from dotenv import load_dotenv
+
+# Imported by every module that reads settings with os.getenv, so .env is
+# loaded exactly once and before the first setting is read.
+load_dotenv()
@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import config  # noqa: F401  # loads .env
+
+import metrics
+
+# Pool sizing and behaviour, overridable per deployment
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', '5'))
+# Connections idle longer than this are pinged before being handed out
+HEALTH_CHECK_IDLE_SECONDS = float(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', '30'))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = None
+_last_used = {}
+_in_use = 0
+
+POOL_CHECKOUTS = metrics.Counter('db_pool_checkouts_total', 'Connections checked out of the pool')
+POOL_CHECKOUT_TIMEOUTS = metrics.Counter('db_pool_checkout_timeouts_total', 'Checkouts that gave up waiting for a free connection')
+POOL_CHECKOUT_ERRORS = metrics.Counter('db_pool_checkout_errors_total', 'Checkouts that failed to obtain a usable connection')
+POOL_RECONNECTS = metrics.Counter('db_pool_reconnects_total', 'Pooled connections replaced after a failed health check')
+POOL_WAIT_SECONDS = metrics.Histogram('db_pool_wait_seconds', 'Time spent waiting for a pooled connection',
+                                      buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+POOL_IN_USE = metrics.Gauge('db_pool_connections_in_use', 'Connections currently checked out',
+                            callback=lambda: _in_use)
+POOL_MAX = metrics.Gauge('db_pool_connections_max', 'Configured maximum pool size',
+                         callback=lambda: POOL_MAX_SIZE)
+
+
+def _reset_after_fork():
+    """Drop the inherited pool in a forked child without closing the parent's sockets"""
+    global _pool, _pool_pid, _slots, _pool_lock, _in_use
+    # Closing here would send a Terminate over sockets the parent still uses,
+    # so the inherited connections are simply abandoned.
+    _pool = None
+    _pool_pid = None
+    _slots = None
+    _pool_lock = threading.Lock()
+    _last_used.clear()
+    _in_use = 0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def init_pool():
+    """Create the connection pool for this process.
+
+    Called lazily on first checkout; pre-fork servers can also call it from a
+    post-fork hook so each worker opens its own connections up front.
+    """
+    global _pool, _pool_pid, _slots
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            return _pool
+        db_url = os.getenv('DATABASE_URL')
+        if not db_url:
+            print("Database connection error: DATABASE_URL is not set")
+            return None
+        try:
+            # psycopg2 is imported on first use so SQLite-only processes never load libpq
+            from psycopg2 import pool as pg_pool
+            _pool = pg_pool.ThreadedConnectionPool(POOL_MIN_SIZE, POOL_MAX_SIZE, db_url)
+            _pool_pid = os.getpid()
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+        except Exception as e:
+            print(f"Database connection error: {e}")
+            _pool = None
+        return _pool
+
+
+def close_pool():
+    """Close every pooled connection (used on shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _last_used.clear()
+
+
+def connect():
+    """Open a dedicated, unpooled connection (for migrations and maintenance scripts)"""
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        raise RuntimeError("DATABASE_URL not found in environment variables.")
+    import psycopg2
+    return psycopg2.connect(db_url)
+
+
+def _get_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    return init_pool()
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    idle = time.monotonic() - _last_used.get(id(conn), 0)
+    if idle < HEALTH_CHECK_IDLE_SECONDS:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _checkout():
+    global _in_use
+    pool = _get_pool()
+    if pool is None:
+        return None
+
+    slots = _slots
+    start = time.monotonic()
+    if not slots.acquire(timeout=CHECKOUT_TIMEOUT):
+        POOL_CHECKOUT_TIMEOUTS.inc()
+        print(f"Database connection error: no pooled connection free after {CHECKOUT_TIMEOUT}s")
+        return None
+    POOL_WAIT_SECONDS.observe(time.monotonic() - start)
+
+    try:
+        conn = pool.getconn()
+        if not _is_healthy(conn):
+            POOL_RECONNECTS.inc()
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except Exception as e:
+        slots.release()
+        POOL_CHECKOUT_ERRORS.inc()
+        print(f"Database connection error: {e}")
+        return None
+
+    POOL_CHECKOUTS.inc()
+    with _pool_lock:
+        _in_use += 1
+    return conn
+
+
+def _release(conn):
+    global _in_use
+    pool = _pool
+    with _pool_lock:
+        _in_use -= 1
+    try:
+        if pool is None:
+            # Pool was closed or reset by a fork while this connection was out
+            conn.close()
+            return
+        from psycopg2 import extensions as pg_extensions
+        broken = bool(conn.closed)
+        if not broken and conn.get_transaction_status() != pg_extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        pool.putconn(conn, close=broken)
+    except Exception as e:
+        print(f"Error returning connection to pool: {e}")
+    finally:
+        if _slots is not None:
+            _slots.release()
+
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection for the duration of a with-block.
+
+    Yields None when the database is unreachable or the pool is exhausted past
+    the checkout timeout, so callers keep their existing fallback behaviour.
+    Any transaction left open is rolled back when the connection is returned.
+    """
+    conn = _checkout()
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            _release(conn)
+
+
+def pool_stats():
+    """Snapshot of pool usage for diagnostics"""
+    return {
+        'min_size': POOL_MIN_SIZE,
+        'max_size': POOL_MAX_SIZE,
+        'in_use': _in_use,
+        'checkouts': POOL_CHECKOUTS.value(),
+        'checkout_timeouts': POOL_CHECKOUT_TIMEOUTS.value(),
+        'checkout_errors': POOL_CHECKOUT_ERRORS.value(),
+        'reconnects': POOL_RECONNECTS.value(),
+        'wait_seconds_total': round(POOL_WAIT_SECONDS.total(), 6),
+    }
@@ -0,0 +1,165 @@
+import os
+import time
+import uuid
+import queue
+import threading
+
+import config  # noqa: F401  # loads .env
+import metrics
+
+EVAL_JOBS_BACKEND = os.getenv('EVAL_JOBS_BACKEND', 'inprocess').lower()
+EVAL_JOB_WORKERS = int(os.getenv('EVAL_JOB_WORKERS', '8'))
+# Jobs allowed to wait for a worker before submissions are refused
+EVAL_JOB_MAX_PENDING = int(os.getenv('EVAL_JOB_MAX_PENDING', '200'))
+# How long a finished job's result stays available for polling
+EVAL_JOB_RESULT_TTL = float(os.getenv('EVAL_JOB_RESULT_TTL', '600'))
+
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0)
+JOBS_TOTAL = metrics.Counter('eval_jobs_total', 'Evaluation jobs finished by kind and outcome', labels=('kind', 'outcome'))
+JOBS_REJECTED = metrics.Counter('eval_jobs_rejected_total', 'Evaluation jobs refused because the queue was full',
+                                labels=('kind',))
+JOB_WAIT_SECONDS = metrics.Histogram('eval_job_wait_seconds', 'Time a job spent queued before a worker picked it up',
+                                     labels=('kind',), buckets=JOB_BUCKETS)
+JOB_RUN_SECONDS = metrics.Histogram('eval_job_run_seconds', 'Time a worker spent running a job',
+                                    labels=('kind',), buckets=JOB_BUCKETS)
+JOBS_QUEUED = metrics.Gauge('eval_jobs_queue_depth', 'Evaluation jobs waiting for a worker')
+JOBS_RUNNING = metrics.Gauge('eval_jobs_running', 'Evaluation jobs currently running')
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are waiting; callers should answer 503 and let the client retry"""
+
+
+class JobQueue:
+    """Runs evaluation callables off the request thread.
+
+    submit() returns a job id straight away; get() and wait() return the job
+    as a dict with job_id, kind, status (queued | running | done | failed) and,
+    once finished, result or error.
+    """
+
+    def submit(self, kind, fn, *args):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """Job dict, or None for unknown or expired ids"""
+        raise NotImplementedError
+
+    def wait(self, job_id, timeout):
+        """Like get(), but blocks up to `timeout` seconds for the job to finish"""
+        raise NotImplementedError
+
+
+class InProcessJobQueue(JobQueue):
+    """Bounded queue drained by a pool of daemon threads in this process; no broker needed.
+
+    Job state lives in this process only, so polls must reach the process that
+    accepted the job (one worker process with threads, or sticky routing).
+    """
+
+    def __init__(self, workers=EVAL_JOB_WORKERS, max_pending=EVAL_JOB_MAX_PENDING, result_ttl=EVAL_JOB_RESULT_TTL):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._running = 0
+        JOBS_QUEUED.set_callback(self._queue.qsize)
+        JOBS_RUNNING.set_callback(lambda: self._running)
+
+    def _ensure_workers(self):
+        # Threads don't survive fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._threads = [threading.Thread(target=self._work, name=f'eval-job-{n}', daemon=True)
+                                 for n in range(self.workers)]
+                for thread in self._threads:
+                    thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, kind, fn, *args):
+        self._ensure_workers()
+        self._expire()
+        job_id = uuid.uuid4().hex
+        job = {'job_id': job_id, 'kind': kind, 'status': 'queued', 'submitted_at': time.time(),
+               'done': threading.Event(), 'finished_at': None}
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait((job, fn, args, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+            JOBS_REJECTED.inc(kind=kind)
+            raise JobQueueFull("Evaluation queue is full, please try again shortly")
+        return job_id
+
+    def _work(self):
+        while True:
+            try:
+                # Wake up while idle too, so finished results don't outlive their TTL
+                job, fn, args, enqueued = self._queue.get(timeout=max(min(self.result_ttl, 60), 1))
+            except queue.Empty:
+                self._expire()
+                continue
+            kind = job['kind']
+            JOB_WAIT_SECONDS.observe(time.monotonic() - enqueued, kind=kind)
+            job['status'] = 'running'
+            with self._lock:
+                self._running += 1
+            started = time.monotonic()
+            try:
+                job['result'] = fn(*args)
+                job['status'] = 'done'
+            except Exception as e:
+                print(f"Evaluation job {job['job_id']} ({kind}) failed: {e}")
+                job['error'] = str(e)
+                job['status'] = 'failed'
+            finally:
+                JOB_RUN_SECONDS.observe(time.monotonic() - started, kind=kind)
+                JOBS_TOTAL.inc(kind=kind, outcome=job['status'])
+                with self._lock:
+                    self._running -= 1
+                job['finished_at'] = time.time()
+                job['done'].set()
+                self._queue.task_done()
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['finished_at'] is not None and job['finished_at'] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def _view(self, job):
+        view = {'job_id': job['job_id'], 'kind': job['kind'], 'status': job['status']}
+        if job['status'] == 'done':
+            view['result'] = job['result']
+        elif job['status'] == 'failed':
+            view['error'] = job['error']
+        return view
+
+    def get(self, job_id):
+        self._expire()
+        job = self._jobs.get(job_id)
+        return self._view(job) if job else None
+
+    def wait(self, job_id, timeout):
+        self._expire()
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job['done'].wait(timeout)
+        return self._view(job)
+
+
+def get_job_queue():
+    """Build the backend selected by EVAL_JOBS_BACKEND (inprocess)"""
+    if EVAL_JOBS_BACKEND == 'inprocess':
+        return InProcessJobQueue()
+    raise ValueError(f"Unknown EVAL_JOBS_BACKEND: {EVAL_JOBS_BACKEND}")
@@ -0,0 +1,87 @@
+import io
+import csv
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+
+EXPORT_COLUMNS = ('id', 'user_id', 'session_id', 'module', 'question_number', 'score', 'max_score', 'timestamp')
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_CHUNK_SIZE = 5000
+
+
+def parse_bound(value):
+    """Normalise a date/datetime filter to 'YYYY-MM-DD HH:MM:SS[.ffffff]'; raises ValueError"""
+    if not value:
+        return None
+    return str(datetime.fromisoformat(value))
+
+
+def _csv_chunk(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows((*row[:7], str(row[7]) if row[7] is not None else '') for row in rows)
+    return buf.getvalue()
+
+
+def _ndjson_chunk(rows):
+    return ''.join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, (*row[:7], str(row[7]) if row[7] is not None else None)))) + '\n'
+        for row in rows
+    )
+
+
+def export_chunks(storage, fmt='csv', start=None, end=None, module=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export as text chunks, one per fetched batch of rows.
+
+    Memory stays bounded by chunk_size however large user_performance grows:
+    rows come from a server-side cursor and each batch is serialised and
+    released before the next is fetched.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if fmt == 'csv':
+        buf = io.StringIO()
+        csv.writer(buf).writerow(EXPORT_COLUMNS)
+        yield buf.getvalue()
+    encode = _csv_chunk if fmt == 'csv' else _ndjson_chunk
+    for rows in storage.iter_performance_export(start=start, end=end, module=module, chunk_size=chunk_size):
+        yield encode(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream user_performance to CSV or NDJSON")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--start', help='inclusive lower bound on timestamp (ISO date or datetime)')
+    parser.add_argument('--end', help='exclusive upper bound on timestamp (ISO date or datetime)')
+    parser.add_argument('--module', help='exact module name, e.g. "Module D - Grammar Quiz"')
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    try:
+        start, end = parse_bound(args.start), parse_bound(args.end)
+    except ValueError as e:
+        parser.error(str(e))
+
+    from storage import get_storage
+    storage = get_storage()
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    began = time.monotonic()
+    size = 0
+    try:
+        for chunk in export_chunks(storage, args.format, start, end, args.module, args.chunk_size):
+            out.write(chunk)
+            size += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    print(f"Exported {size / 1024:.0f} KiB in {time.monotonic() - began:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+import config  # noqa: F401  # loads .env
+
+import metrics
+
+# Werkzeug method string, defaulting to Werkzeug's own (memory-hard scrypt).
+# Stored hashes of the same algorithm with weaker cost parameters are upgraded
+# on the next successful login; other algorithms are only migrated when listed
+# in PASSWORD_HASH_UPGRADE_FROM (e.g. "pbkdf2"), never implicitly.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_HASH_UPGRADE_FROM = {a.strip() for a in os.getenv('PASSWORD_HASH_UPGRADE_FROM', '').split(',') if a.strip()}
+# 0 hashes inline on the calling thread (handy for local runs and scripts)
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', str(os.cpu_count() or 2)))
+# Hash jobs allowed in flight (running + queued) before callers get HashingBusy
+HASH_MAX_PENDING = int(os.getenv('HASH_MAX_PENDING', str(max(HASH_WORKERS, 1) * 4)))
+# How long a caller may wait for a free queue slot before giving up
+HASH_QUEUE_TIMEOUT = float(os.getenv('HASH_QUEUE_TIMEOUT', '0.05'))
+HASH_RESULT_TIMEOUT = float(os.getenv('HASH_RESULT_TIMEOUT', '10'))
+
+HASH_PENDING = metrics.Gauge('password_hash_pending', 'Password hash jobs queued or running')
+HASH_REJECTED = metrics.Counter('password_hash_rejected_total', 'Hash requests refused because the pool was saturated')
+HASH_SECONDS = metrics.Histogram('password_hash_seconds', 'Wall time of a password hash or check, including queueing',
+                                 labels=('op',))
+HASH_UPGRADES = metrics.Counter('password_hash_upgrades_total', 'Stored hashes re-hashed to the current parameters')
+
+_executor = None
+_executor_pid = None
+_slots = None
+_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """The hashing pool is saturated; callers should answer 503 and let the client retry"""
+
+
+def _get_executor():
+    global _executor, _executor_pid, _slots
+    if _executor is not None and _executor_pid == os.getpid():
+        return _executor
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # spawn: workers must not inherit the server's threads, sockets or pool.
+            # Each spawned worker re-imports the main module, so start the server
+            # through run.py (or a WSGI server), not `python app.py`. With
+            # HASH_MP_CONTEXT=forkserver the main module is imported once, in the
+            # fork server, and workers are forked from that clean process.
+            context = multiprocessing.get_context(os.getenv('HASH_MP_CONTEXT', 'spawn'))
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=context)
+            _executor_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
+        return _executor
+
+
+def _reset_executor(broken):
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+
+
+def _run(op, fn, *args):
+    start = time.monotonic()
+    try:
+        if HASH_WORKERS <= 0:
+            return fn(*args)
+        executor = _get_executor()
+        slots = _slots
+        if not slots.acquire(timeout=HASH_QUEUE_TIMEOUT):
+            HASH_REJECTED.inc()
+            raise HashingBusy("Server is busy, please try again shortly")
+        HASH_PENDING.inc()
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            HASH_PENDING.dec()
+            slots.release()
+            raise
+
+        def _done(_):
+            HASH_PENDING.dec()
+            slots.release()
+
+        future.add_done_callback(_done)
+        try:
+            return future.result(timeout=HASH_RESULT_TIMEOUT)
+        except FutureTimeout:
+            raise HashingBusy("Server is busy, please try again shortly")
+        except BrokenProcessPool:
+            # A worker died; build a fresh pool for the next caller
+            _reset_executor(executor)
+            raise HashingBusy("Server is busy, please try again shortly")
+    finally:
+        HASH_SECONDS.observe(time.monotonic() - start, op=op)
+
+
+def hash_password(password):
+    """Hash a password with the current parameters off the request thread"""
+    return _run('hash', generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def _parse_method(method):
+    """(algorithm, cost parameters) of a Werkzeug method string, filling in Werkzeug's defaults"""
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        costs = [int(part) for part in parts[1:4]]
+        return 'scrypt', tuple(costs + [2 ** 15, 8, 1][len(costs):])
+    if parts[0] == 'pbkdf2':
+        hash_name = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = int(parts[2]) if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}', (iterations,)
+    return method, ()
+
+
+def needs_rehash(password_hash):
+    """True when the stored hash is weaker than PASSWORD_HASH_METHOD within the same
+    algorithm, or uses an algorithm listed in PASSWORD_HASH_UPGRADE_FROM"""
+    try:
+        algorithm, costs = _parse_method(password_hash.split('$', 1)[0])
+        target_algorithm, target_costs = _parse_method(PASSWORD_HASH_METHOD)
+    except ValueError:
+        return False
+    if algorithm == target_algorithm:
+        return any(cost < target for cost, target in zip(costs, target_costs))
+    return algorithm in PASSWORD_HASH_UPGRADE_FROM or algorithm.split(':')[0] in PASSWORD_HASH_UPGRADE_FROM
+
+
+def verify_password(password_hash, password):
+    """Check a password off the request thread.
+
+    Returns (valid, upgraded_hash); upgraded_hash is a fresh hash with the
+    current parameters when the stored one is outdated, otherwise None.
+    """
+    if not _run('check', check_password_hash, password_hash, password):
+        return False, None
+    if not needs_rehash(password_hash):
+        return True, None
+    try:
+        upgraded = hash_password(password)
+    except HashingBusy:
+        # Login still succeeds; the upgrade happens on a quieter login
+        return True, None
+    HASH_UPGRADES.inc()
+    return True, upgraded
@@ -0,0 +1,75 @@
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+# Modules kept out of start-up on purpose; importing any of them from app.py
+# again is a regression even if the total still fits the budget.
+LAZY_MODULES = ('google.genai', 'edge_tts', 'psycopg2', 'aiohttp', 'httpx')
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from `python -X importtime` output"""
+    entries = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def measure(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    entries = parse_importtime(result.stderr)
+    total = next((cumulative for name, _, cumulative, depth in entries if name == module and depth == 0), None)
+    if total is None:
+        raise RuntimeError(f"No importtime entry for {module}")
+    return total, entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long importing the app takes (python -X importtime)")
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to time; the median is reported')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--budget-ms', type=float, help='fail if the median import time exceeds this')
+    parser.add_argument('--allow-eager', action='store_true',
+                        help=f"don't fail when one of {', '.join(LAZY_MODULES)} is imported at start-up")
+    args = parser.parse_args(argv)
+
+    # The first run also writes .pyc files; keep it out of the numbers
+    measure(args.module)
+    runs = [measure(args.module) for _ in range(max(args.runs, 1))]
+    totals = sorted(total for total, _ in runs)
+    median_us = statistics.median(totals)
+    _, entries = min(runs, key=lambda run: abs(run[0] - median_us))
+
+    print(f"import {args.module}: median {median_us / 1000:.1f} ms "
+          f"(min {totals[0] / 1000:.1f}, max {totals[-1] / 1000:.1f}, {len(totals)} runs)")
+    print(f"\n{'cumulative ms':>14} {'self ms':>8}  module")
+    for name, self_us, cumulative_us, _ in sorted(entries, key=lambda e: e[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
+    failed = False
+    eager = sorted({name for name, _, _, _ in entries
+                    if any(name == lazy or name.startswith(lazy + '.') for lazy in LAZY_MODULES)})
+    eager_roots = sorted({lazy for lazy in LAZY_MODULES
+                          if any(name == lazy or name.startswith(lazy + '.') for name in eager)})
+    if eager_roots:
+        print(f"\nImported at start-up but meant to be lazy: {', '.join(eager_roots)}")
+        failed = failed or not args.allow_eager
+    if args.budget_ms is not None and median_us / 1000 > args.budget_ms:
+        print(f"\nOver budget: {median_us / 1000:.1f} ms > {args.budget_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
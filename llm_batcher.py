@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import config  # noqa: F401  # loads .env
+
+import metrics
+
+LLM_BATCHING = os.getenv('LLM_BATCHING', '0') == '1'
+# How long the first pending item waits for company, and the most items per call
+LLM_BATCH_WINDOW = float(os.getenv('LLM_BATCH_WINDOW', '0.05'))
+LLM_BATCH_MAX_ITEMS = int(os.getenv('LLM_BATCH_MAX_ITEMS', '8'))
+LLM_BATCH_WORKERS = int(os.getenv('LLM_BATCH_WORKERS', '8'))
+# A caller waiting longer than this gives up on its batch and calls the model alone
+LLM_BATCH_TIMEOUT = float(os.getenv('LLM_BATCH_TIMEOUT', '30'))
+
+BATCH_SIZE = metrics.Histogram('llm_batch_size', 'Evaluations sent per Gemini call', labels=('group',),
+                               buckets=(1, 2, 4, 8, 16, 32))
+BATCH_FALLBACKS = metrics.Counter('llm_batch_fallbacks_total',
+                                  'Batches whose response could not be split and were re-sent item by item')
+BATCH_TIMEOUTS = metrics.Counter('llm_batch_timeouts_total',
+                                 'Submissions that waited past the batch timeout and were sent on their own')
+
+
+class MicroBatcher:
+    """Collects submissions for up to `window` seconds (or `max_items`) and sends
+    each group in one upstream call.
+
+    call_one(payload) -> result handles a single item. call_batch(payloads) ->
+    list of results in order, or None when the response cannot be split back
+    up, in which case every item is re-sent through call_one. Exceptions from
+    either propagate to the waiting callers.
+
+    The collector thread and worker pool start on first use in each process,
+    so a batcher created before a pre-fork server forks still works in the
+    workers.
+    """
+
+    def __init__(self, call_one, call_batch, window=LLM_BATCH_WINDOW, max_items=LLM_BATCH_MAX_ITEMS,
+                 workers=LLM_BATCH_WORKERS, timeout=LLM_BATCH_TIMEOUT):
+        self.call_one = call_one
+        self.call_batch = call_batch
+        self.window = window
+        self.max_items = max(1, max_items)
+        self.workers = workers
+        self.timeout = timeout
+        self._start_lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so each process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._pending = {}
+                self._cond = threading.Condition()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='llm-batch')
+                self._thread = threading.Thread(target=self._run, args=(self._cond,), name='llm-batcher',
+                                                daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, group, payload):
+        """Queue one item; items only batch with others of the same group. Blocks for the result.
+
+        After `timeout` seconds the caller stops waiting and sends the item
+        through call_one itself.
+        """
+        self._ensure_started()
+        future = Future()
+        with self._cond:
+            queue = self._pending.get(group)
+            if queue is None:
+                queue = self._pending[group] = {"since": time.monotonic(), "items": []}
+            queue["items"].append((payload, future))
+            self._cond.notify()
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            # Cancelled items are skipped at dispatch; one already in flight just finishes unread
+            future.cancel()
+            BATCH_TIMEOUTS.inc()
+            print(f"LLM batch result not ready after {self.timeout}s; sending the item on its own")
+            return self.call_one(payload)
+
+    def _due_groups(self, now):
+        due = []
+        for group, queue in list(self._pending.items()):
+            if len(queue["items"]) >= self.max_items or now - queue["since"] >= self.window:
+                due.append((group, queue["items"]))
+                del self._pending[group]
+        return due
+
+    def _run(self, cond):
+        while True:
+            with cond:
+                while not self._pending:
+                    cond.wait()
+                now = time.monotonic()
+                due = self._due_groups(now)
+                if not due:
+                    oldest = min(q["since"] for q in self._pending.values())
+                    cond.wait(max(oldest + self.window - now, 0.001))
+                    continue
+            for group, items in due:
+                for start in range(0, len(items), self.max_items):
+                    self._executor.submit(self._dispatch, group, items[start:start + self.max_items])
+
+    def _dispatch(self, group, items):
+        # Drop items whose caller already timed out and went it alone
+        items = [(payload, future) for payload, future in items if future.set_running_or_notify_cancel()]
+        if not items:
+            return
+        BATCH_SIZE.observe(len(items), group=group)
+        if len(items) == 1:
+            self._dispatch_one(*items[0])
+            return
+        try:
+            results = self.call_batch([payload for payload, _ in items])
+            if results is None or len(results) != len(items):
+                BATCH_FALLBACKS.inc()
+                print(f"LLM batch of {len(items)} could not be split; sending items individually")
+                for payload, future in items:
+                    self._executor.submit(self._dispatch_one, payload, future)
+                return
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
+
+    def _dispatch_one(self, payload, future):
+        try:
+            future.set_result(self.call_one(payload))
+        except Exception as e:
+            future.set_exception(e)
@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import metrics
+
+CACHE_LOOKUPS = metrics.Counter('llm_cache_lookups_total', 'LLM evaluation cache lookups by result',
+                                labels=('result',))
+CACHE_EVICTIONS = metrics.Counter('llm_cache_evictions_total', 'LLM evaluation cache entries evicted',
+                                  labels=('tier', 'reason'))
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text, strip_punctuation=True):
+    """Case-, whitespace- and (optionally) punctuation-insensitive form of a transcript"""
+    text = (text or "").lower()
+    if strip_punctuation:
+        text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _bucket(value, width):
+    try:
+        return round(float(value) / width) * width
+    except (TypeError, ValueError):
+        return None
+
+
+def evaluation_cache_key(mode, context_text, user_text, metrics_info=None):
+    """Stable key for an evaluation request.
+
+    Repetition prompts already tell the model to ignore case and punctuation,
+    so those are normalised away; topic answers keep punctuation since it can
+    affect the grammar score. Speaking-rate metrics are bucketed (0.25 wps,
+    1 s) so near-identical timings share an entry.
+    """
+    strip = mode == "repetition"
+    parts = [mode, normalize_text(context_text, strip), normalize_text(user_text, strip)]
+    if metrics_info and "wps" in metrics_info:
+        parts.append(_bucket(metrics_info.get("wps", 0), 0.25))
+        parts.append(_bucket(metrics_info.get("duration", 0), 1.0))
+    raw = json.dumps(parts, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EvaluationCache:
+    """Two-tier cache of LLM evaluations: an in-memory LRU backed by a SQLite file.
+
+    Entries live for `ttl` seconds. The memory tier holds at most
+    `max_entries`; the disk tier is trimmed by least-recent access once it
+    exceeds `max_bytes`, so it survives restarts without growing unbounded.
+    The disk file is shared by every worker process, so its size is read
+    from the file rather than tracked per process; to keep writes cheap that
+    check runs once every `evict_every` puts. A disk hit only rewrites the
+    entry's access time when it is more than `touch_interval` seconds old.
+    """
+
+    def __init__(self, path="llm_cache.db", ttl=7 * 24 * 3600, max_entries=2048, max_bytes=64 * 1024 * 1024,
+                 evict_every=64, touch_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_every = max(1, evict_every)
+        self.touch_interval = touch_interval
+        self._puts_since_evict = None
+        self._memory = OrderedDict()
+        # Memory hits never wait on SQLite: each tier has its own lock
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk = None
+        self._disk_pid = None
+
+    # ----- public API -----
+
+    def get(self, key):
+        """Cached evaluation dict (a fresh copy) or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    CACHE_LOOKUPS.inc(result="memory_hit")
+                    return json.loads(value)
+                del self._memory[key]
+                CACHE_EVICTIONS.inc(tier="memory", reason="expired")
+
+        with self._disk_lock:
+            row = self._disk_get(key, now)
+        if row is not None:
+            value, created = row
+            with self._lock:
+                self._memory_put(key, value, created)
+            CACHE_LOOKUPS.inc(result="disk_hit")
+            return json.loads(value)
+
+        CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    def put(self, key, evaluation):
+        value = json.dumps(evaluation)
+        created = time.time()
+        with self._lock:
+            self._memory_put(key, value, created)
+        with self._disk_lock:
+            self._disk_put(key, value, created)
+
+    def stats(self):
+        hits = CACHE_LOOKUPS.value(result="memory_hit") + CACHE_LOOKUPS.value(result="disk_hit")
+        misses = CACHE_LOOKUPS.value(result="miss")
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": CACHE_LOOKUPS.value(result="memory_hit"),
+            "disk_hits": CACHE_LOOKUPS.value(result="disk_hit"),
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "disk_bytes": self._disk_size(),
+        }
+
+    # ----- memory tier -----
+
+    def _memory_put(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            CACHE_EVICTIONS.inc(tier="memory", reason="size")
+
+    # ----- disk tier -----
+
+    def _db(self):
+        if self._disk is None or self._disk_pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS evaluation_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluation_cache_accessed ON evaluation_cache (accessed_at)")
+            conn.commit()
+            self._disk = conn
+            self._disk_pid = os.getpid()
+            # Check the budget on the first put in each process
+            self._puts_since_evict = self.evict_every
+        return self._disk
+
+    def _disk_size(self):
+        try:
+            with self._disk_lock:
+                return self._db().execute("SELECT COALESCE(SUM(size), 0) FROM evaluation_cache").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def _disk_get(self, key, now):
+        try:
+            db = self._db()
+            row = db.execute("SELECT value, created_at, accessed_at FROM evaluation_cache WHERE key = ?",
+                             (key,)).fetchone()
+            if row is None:
+                return None
+            value, created, accessed = row
+            if now - created > self.ttl:
+                db.execute("DELETE FROM evaluation_cache WHERE key = ?", (key,))
+                db.commit()
+                CACHE_EVICTIONS.inc(tier="disk", reason="expired")
+                return None
+            # LRU order only needs minute resolution; skip the write for recently touched entries
+            if now - accessed > self.touch_interval:
+                db.execute("UPDATE evaluation_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                db.commit()
+            return value, created
+        except sqlite3.Error as e:
+            print(f"LLM cache read error: {e}")
+            return None
+
+    def _disk_put(self, key, value, created):
+        try:
+            db = self._db()
+            db.execute("""
+                INSERT OR REPLACE INTO evaluation_cache (key, value, created_at, accessed_at, size)
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, value, created, created, len(value) + len(key)))
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= self.evict_every:
+                self._puts_since_evict = 0
+                self._disk_evict(db, created)
+            db.commit()
+        except sqlite3.Error as e:
+            print(f"LLM cache write error: {e}")
+
+    def _disk_evict(self, db, now):
+        """Drop expired rows, then least-recently-accessed ones until back under 90% of the budget"""
+        # Summed from the file: every worker process writes to it
+        used = db.execute("SELECT COALESCE(SUM(size), 0) FROM evaluation_cache").fetchone()[0]
+        if used <= self.max_bytes:
+            return
+        expired = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM evaluation_cache WHERE created_at < ?",
+                             (now - self.ttl,)).fetchone()
+        if expired[0]:
+            db.execute("DELETE FROM evaluation_cache WHERE created_at < ?", (now - self.ttl,))
+            used -= expired[1]
+            CACHE_EVICTIONS.inc(expired[0], tier="disk", reason="expired")
+        target = self.max_bytes * 0.9
+        while used > target:
+            victims = db.execute(
+                "SELECT key, size FROM evaluation_cache ORDER BY accessed_at LIMIT 100").fetchall()
+            if not victims:
+                break
+            for victim_key, size in victims:
+                if used <= target:
+                    break
+                db.execute("DELETE FROM evaluation_cache WHERE key = ?", (victim_key,))
+                used -= size
+                CACHE_EVICTIONS.inc(tier="disk", reason="size")
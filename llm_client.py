@@ -0,0 +1,244 @@
+import os
+import time
+import random
+import threading
+
+import config  # noqa: F401  # loads .env
+
+import metrics
+
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-2.0-flash')
+# Per-attempt HTTP timeout and the overall budget for one call including retries
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '8'))
+LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', '15'))
+LLM_RETRIES = int(os.getenv('LLM_RETRIES', '2'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '4'))
+# Consecutive failed calls that open the breaker, and how long it stays open
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+LLM_RETRIES_TOTAL = metrics.Counter('llm_retries_total', 'LLM call attempts retried after a transient error')
+LLM_REJECTED = metrics.Counter('llm_circuit_rejected_total', 'LLM calls refused while the circuit breaker was open')
+LLM_BREAKER_STATE = metrics.Gauge('llm_circuit_state', 'LLM circuit breaker state (0 closed, 1 half-open, 2 open)')
+
+# Per-call instrumentation. Labels stay low-cardinality: mode is the evaluation
+# mode (topic/repetition), call is single/batch/stream, error is a class name or HTTP status.
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0)
+LLM_SECONDS = metrics.Histogram('llm_request_seconds', 'Wall time of a Gemini call including retries',
+                                labels=('mode', 'call', 'outcome'), buckets=LLM_BUCKETS)
+LLM_FIRST_CHUNK_SECONDS = metrics.Histogram('llm_first_chunk_seconds', 'Time until the first streamed chunk',
+                                            labels=('mode',), buckets=LLM_BUCKETS)
+LLM_TOKENS = metrics.Counter('llm_tokens_total', 'Tokens reported in usage metadata',
+                             labels=('mode', 'kind'))
+LLM_COST = metrics.Counter('llm_estimated_cost_usd_total', 'Estimated spend from token counts and configured prices',
+                           labels=('mode',))
+LLM_ERRORS = metrics.Counter('llm_errors_total', 'Failed Gemini attempts by error class', labels=('mode', 'error'))
+
+# USD per million tokens, for the cost estimate (defaults: gemini-2.0-flash list price)
+LLM_PRICE_INPUT = float(os.getenv('LLM_PRICE_INPUT_PER_MTOK', '0.10'))
+LLM_PRICE_OUTPUT = float(os.getenv('LLM_PRICE_OUTPUT_PER_MTOK', '0.40'))
+
+
+class LLMUnavailable(Exception):
+    """The upstream model could not answer in time; callers should fall back to a local score"""
+
+
+class CircuitOpen(LLMUnavailable):
+    """The breaker is open and the call was not attempted"""
+
+
+def error_class(exc):
+    from google.genai import errors
+    if isinstance(exc, errors.APIError):
+        return f"http_{exc.code}"
+    return type(exc).__name__
+
+
+def record_usage(usage, mode):
+    """Count tokens (and estimated cost) from a response's usage_metadata"""
+    if usage is None:
+        return
+    prompt = usage.prompt_token_count or 0
+    response = usage.candidates_token_count or 0
+    cached = getattr(usage, 'cached_content_token_count', None) or 0
+    thoughts = getattr(usage, 'thoughts_token_count', None) or 0
+    LLM_TOKENS.inc(prompt, mode=mode, kind='prompt')
+    LLM_TOKENS.inc(response, mode=mode, kind='response')
+    if cached:
+        LLM_TOKENS.inc(cached, mode=mode, kind='cached')
+    if thoughts:
+        LLM_TOKENS.inc(thoughts, mode=mode, kind='thoughts')
+    LLM_COST.inc((prompt * LLM_PRICE_INPUT + (response + thoughts) * LLM_PRICE_OUTPUT) / 1_000_000, mode=mode)
+
+
+def is_retryable(exc):
+    import httpx
+    from google.genai import errors
+    if isinstance(exc, errors.APIError):
+        return exc.code in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures; after `reset_timeout`
+    a single probe is let through (half-open) and its outcome closes or re-opens it."""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                if self.state != self.OPEN:
+                    print(f"LLM circuit breaker opened after {self._failures} consecutive failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class ResilientClient:
+    """generate_content with per-attempt timeouts, jittered exponential retries
+    inside an overall deadline, and a circuit breaker in front of it all."""
+
+    def __init__(self, client, model=LLM_MODEL, timeout=LLM_TIMEOUT, deadline=LLM_DEADLINE,
+                 retries=LLM_RETRIES, backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX,
+                 breaker=None):
+        self.client = client
+        self.model = model
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET)
+        LLM_BREAKER_STATE.set_callback(lambda: self.breaker.state)
+
+    def _attempt_config(self, generation_config, remaining):
+        from google.genai import types
+        attempt_config = generation_config.model_copy() if generation_config is not None else types.GenerateContentConfig()
+        attempt_config.http_options = types.HttpOptions(timeout=int(max(min(self.timeout, remaining), 0.1) * 1000))
+        return attempt_config
+
+    def _backoff(self, attempt):
+        # Full jitter: uniform over [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def generate_content(self, contents, generation_config=None, mode='other', call='single'):
+        if not self.breaker.allow():
+            LLM_REJECTED.inc()
+            LLM_ERRORS.inc(mode=mode, error='CircuitOpen')
+            raise CircuitOpen("LLM circuit breaker is open")
+
+        started = time.monotonic()
+        give_up_at = started + self.deadline
+        attempt = 0
+        while True:
+            attempt_config = self._attempt_config(generation_config, give_up_at - time.monotonic())
+            try:
+                response = self.client.models.generate_content(
+                    model=self.model, contents=contents, config=attempt_config)
+            except Exception as e:
+                LLM_ERRORS.inc(mode=mode, error=error_class(e))
+                if not is_retryable(e):
+                    # The request itself was bad; the upstream is healthy
+                    self.breaker.record_success()
+                    LLM_SECONDS.observe(time.monotonic() - started, mode=mode, call=call, outcome='error')
+                    raise
+                delay = self._backoff(attempt)
+                if attempt >= self.retries or time.monotonic() + delay >= give_up_at:
+                    self.breaker.record_failure()
+                    LLM_SECONDS.observe(time.monotonic() - started, mode=mode, call=call, outcome='error')
+                    raise LLMUnavailable(f"LLM call failed after {attempt + 1} attempt(s): {e}") from e
+                print(f"LLM call attempt {attempt + 1} failed ({e}); retrying in {delay:.2f}s")
+                LLM_RETRIES_TOTAL.inc()
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            LLM_SECONDS.observe(time.monotonic() - started, mode=mode, call=call, outcome='ok')
+            record_usage(getattr(response, 'usage_metadata', None), mode)
+            return response
+
+    def generate_content_stream(self, contents, generation_config=None, mode='other'):
+        """Yield response text chunks as they arrive.
+
+        Retries only happen before the first chunk; once output has started
+        a failure is surfaced as LLMUnavailable so the caller can fall back.
+        """
+        if not self.breaker.allow():
+            LLM_REJECTED.inc()
+            LLM_ERRORS.inc(mode=mode, error='CircuitOpen')
+            raise CircuitOpen("LLM circuit breaker is open")
+
+        began = time.monotonic()
+        give_up_at = began + self.deadline
+        attempt = 0
+        started = False
+        usage = None
+        while True:
+            attempt_config = self._attempt_config(generation_config, give_up_at - time.monotonic())
+            try:
+                for chunk in self.client.models.generate_content_stream(
+                        model=self.model, contents=contents, config=attempt_config):
+                    if not started:
+                        started = True
+                        LLM_FIRST_CHUNK_SECONDS.observe(time.monotonic() - began, mode=mode)
+                    # Usage metadata is cumulative; the last chunk carries the totals
+                    usage = getattr(chunk, 'usage_metadata', None) or usage
+                    if chunk.text:
+                        yield chunk.text
+            except GeneratorExit:
+                # Consumer went away mid-stream; the upstream itself was answering
+                self.breaker.record_success()
+                record_usage(usage, mode)
+                raise
+            except Exception as e:
+                LLM_ERRORS.inc(mode=mode, error=error_class(e))
+                if not is_retryable(e):
+                    self.breaker.record_success()
+                    LLM_SECONDS.observe(time.monotonic() - began, mode=mode, call='stream', outcome='error')
+                    raise
+                delay = self._backoff(attempt)
+                if started or attempt >= self.retries or time.monotonic() + delay >= give_up_at:
+                    self.breaker.record_failure()
+                    LLM_SECONDS.observe(time.monotonic() - began, mode=mode, call='stream', outcome='error')
+                    raise LLMUnavailable(f"LLM stream failed after {attempt + 1} attempt(s): {e}") from e
+                print(f"LLM stream attempt {attempt + 1} failed ({e}); retrying in {delay:.2f}s")
+                LLM_RETRIES_TOTAL.inc()
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            LLM_SECONDS.observe(time.monotonic() - began, mode=mode, call='stream', outcome='ok')
+            record_usage(usage, mode)
+            return
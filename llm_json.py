@@ -0,0 +1,163 @@
+import json
+
+# Tolerant, incremental JSON extraction for model output.
+#
+# The scanner skips anything before the first '{' or '[' (prose, ``` fences),
+# stops at the matching close, and remembers the last point at which the text
+# seen so far can be closed off into valid JSON. That gives a usable partial
+# object while a response is still streaming, and a best-effort object when a
+# response is truncated or wrapped in noise. Trailing commas before a close
+# bracket are recorded by position, so commas inside strings are never touched.
+
+
+class IncrementalJSONParser:
+    """Feed text chunks; read partial() at any time and result() at the end"""
+
+    def __init__(self):
+        self.text = ""
+        self.complete = False
+        self._start = None
+        self._end = None
+        self._pos = 0
+        self._stack = []          # frames: [opener, expecting] with expecting in key/colon/value/comma
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._safe_cut = None     # index the text can be truncated at ...
+        self._safe_closers = ""   # ... and the closing brackets it then needs
+        self._comma = None        # index of a structural comma not yet followed by a value
+        self._trailing_commas = []  # indexes of commas directly before a close bracket
+        self._last_partial = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        if not self.complete:
+            self._scan()
+        return self.partial()
+
+    # ----- scanning -----
+
+    def _closers(self):
+        return "".join("}" if opener == "{" else "]" for opener, _ in reversed(self._stack))
+
+    def _mark_safe(self, cut):
+        self._safe_cut = cut
+        self._safe_closers = self._closers()
+
+    def _value_done(self):
+        if self._stack:
+            self._stack[-1][1] = "comma"
+
+    def _scan(self):
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            if self._start is None:
+                if ch in "{[":
+                    self._start = i
+                    self._stack.append([ch, "key" if ch == "{" else "value"])
+                    self._mark_safe(i + 1)
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._stack[-1][1] = "colon"
+                    else:
+                        self._value_done()
+                        self._mark_safe(i + 1)
+                i += 1
+                continue
+
+            if not ch.isspace() and ch != ",":
+                if ch in "}]" and self._comma is not None:
+                    self._trailing_commas.append(self._comma)
+                self._comma = None
+
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = self._stack[-1][0] == "{" and self._stack[-1][1] == "key"
+            elif ch in "{[":
+                self._stack.append([ch, "key" if ch == "{" else "value"])
+                self._mark_safe(i + 1)
+            elif ch in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    self.complete = True
+                    self._end = i + 1
+                    self._pos = i + 1
+                    return
+                self._value_done()
+                self._mark_safe(i + 1)
+            elif ch == ":":
+                self._stack[-1][1] = "value"
+            elif ch == ",":
+                self._comma = i
+                self._mark_safe(i)
+                self._stack[-1][1] = "key" if self._stack[-1][0] == "{" else "value"
+            elif not ch.isspace() and self._stack[-1][1] == "value":
+                # Start of a number or literal; it is only safe once a delimiter follows
+                self._stack[-1][1] = "comma"
+            i += 1
+        self._pos = i
+
+    # ----- results -----
+
+    def _slice(self, end):
+        """Text from the opening bracket up to end, minus any trailing commas"""
+        parts, cut = [], self._start
+        for comma in self._trailing_commas:
+            if comma >= end:
+                break
+            parts.append(self.text[cut:comma])
+            cut = comma + 1
+        parts.append(self.text[cut:end])
+        return "".join(parts)
+
+    def partial(self):
+        """Best-effort object from the text so far (None until something parses)"""
+        if self._start is None:
+            return None
+        if self.complete:
+            return self.result()
+        candidates = []
+        if self._in_string and not self._string_is_key:
+            body = self._slice(self._pos)
+            # Hold back an unfinished escape sequence (at most '\uXXX')
+            for trim in range(0, 6):
+                candidates.append(body[:len(body) - trim] + '"' + self._closers())
+        if self._safe_cut is not None:
+            candidates.append(self._slice(self._safe_cut) + self._safe_closers)
+        for candidate in candidates:
+            try:
+                self._last_partial = json.loads(candidate)
+                break
+            except ValueError:
+                continue
+        return self._last_partial
+
+    def result(self):
+        """The parsed object; falls back to the partial object for truncated output.
+
+        Raises ValueError when nothing object-like could be recovered.
+        """
+        if self.complete:
+            return json.loads(self._slice(self._end))
+        value = self.partial()
+        if value is None:
+            raise ValueError("No JSON object found in model output")
+        return value
+
+
+def extract_json(text):
+    """First JSON object or array in `text`, tolerating fences, prose and truncation"""
+    parser = IncrementalJSONParser()
+    parser.feed(text or "")
+    return parser.result()
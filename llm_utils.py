@@ -1,48 +1,172 @@
 import os
-import json
-import re
-from google import genai
-from dotenv import load_dotenv
+import copy
+import time
+import threading
+from functools import lru_cache
+import config  # noqa: F401  # loads .env
 
-load_dotenv()
+from llm_cache import EvaluationCache, evaluation_cache_key
+import repetition_scorer
+from llm_client import ResilientClient, LLMUnavailable
+from llm_batcher import MicroBatcher, LLM_BATCHING
+from llm_json import IncrementalJSONParser, extract_json
+import metrics as app_metrics
 
-# Initialize Gemini Client once
-gemini_client = None
 api_key = os.getenv("GEMINI_API_KEY")
-if api_key:
-    try:
-        gemini_client = genai.Client(api_key=api_key)
-    except Exception as e:
-        print(f"Error initializing Gemini client: {e}")
-
-def clean_json_response(text):
-    """Refined JSON cleanup to handle potential markdown formatting."""
-    text = text.strip()
-    # Remove markdown code blocks if present
-    text = re.sub(r'^```json\s*|\s*```$', '', text, flags=re.MULTILINE)
-    return text
+_llm = None
+_llm_failed = False
+_llm_lock = threading.Lock()
 
-def evaluate_speaking_response(user_text, context_text, mode="topic", metrics=None):
+def get_llm():
     """
-    Evaluates a user's spoken response using Gemini.
-    
-    Args:
-        user_text (str): The transcribed text from the user.
-        context_text (str): The context (e.g., the topic or the target sentence).
-        mode (str): 'topic' for Module C, 'repetition' for Modules A/B.
-        
-    Returns:
-        dict: A dictionary containing scores and feedback.
+    The Gemini client wrapped with deadlines, retries and a circuit breaker
+    (llm_client.ResilientClient), created on first use because importing
+    google.genai dominates worker start-up. None when no API key is set or
+    the client could not be built.
     """
-    if not gemini_client:
-        return {
-            "error": "Gemini API key not configured",
-            "feedback": "AI evaluation unavailable.",
-            "total_score": 0
+    global _llm, _llm_failed
+    if _llm is None and api_key and not _llm_failed:
+        with _llm_lock:
+            if _llm is None and not _llm_failed:
+                try:
+                    from google import genai
+                    _llm = ResilientClient(genai.Client(api_key=api_key))
+                except Exception as e:
+                    _llm_failed = True
+                    print(f"Error initializing Gemini client: {e}")
+    return _llm
+
+# Identical answers (e.g. a perfect reading of a bank sentence) reuse an earlier evaluation
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+evaluation_cache = EvaluationCache(
+    path=os.getenv("LLM_CACHE_PATH", "llm_cache.db"),
+    ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048")),
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+
+# End-to-end evaluation time, whichever path answered (fast path, cache, Gemini or fallback)
+EVALUATION_SECONDS = app_metrics.Histogram('evaluation_seconds', 'Wall time of evaluate_speaking_response',
+                                           labels=('mode',),
+                                           buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0))
+LLM_PARSE_FAILURES = app_metrics.Counter('llm_parse_failures_total',
+                                         'Gemini replies that did not contain a usable scoring object',
+                                         labels=('mode', 'call'))
+LLM_COALESCED = app_metrics.Counter('llm_coalesced_calls_total',
+                                    'Evaluations that waited on an identical in-flight Gemini call')
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key wait for it and share the result"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+        if not leader:
+            LLM_COALESCED.inc()
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            # Each caller gets its own copy so nobody mutates a shared dict
+            return copy.deepcopy(call["result"])
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+inflight_evaluations = SingleFlight()
+
+# Ask Gemini for schema-constrained JSON; property order matches the prompt so
+# sub-scores stream before the feedback text
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "1") != "0"
+
+@lru_cache(maxsize=None)
+def evaluation_schema(mode):
+    """Response schema for one evaluation; built on first use since it needs google.genai.types"""
+    from google.genai import types
+
+    def score(maximum):
+        return types.Schema(type=types.Type.INTEGER, minimum=0, maximum=maximum)
+
+    text_list = types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING))
+    if mode == "topic":
+        fields = [("relevance_score", score(25)), ("grammar_score", score(25)),
+                  ("vocabulary_score", score(25)), ("coherence_score", score(25))]
+    else:
+        fields = [("accuracy_score", score(40)), ("pronunciation_score", score(30)), ("fluency_score", score(30))]
+    fields += [("total_score", score(100)), ("feedback", types.Schema(type=types.Type.STRING)),
+               ("strengths", text_list), ("improvements", text_list)]
+    return types.Schema(
+        type=types.Type.OBJECT,
+        properties=dict(fields),
+        required=[name for name, _ in fields],
+        property_ordering=[name for name, _ in fields],
+    )
+
+def evaluation_config(mode, batch=False):
+    """GenerateContentConfig requesting JSON matching the mode's schema (an array of them for batches)"""
+    if not LLM_STRUCTURED_OUTPUT or mode not in ("topic", "repetition"):
+        return None
+    from google.genai import types
+    schema = evaluation_schema(mode)
+    if batch:
+        schema = types.Schema(type=types.Type.ARRAY, items=schema)
+    return types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
+
+def parse_evaluation(text, mode="other", call="single"):
+    """Scoring object from model output, tolerating fences, stray prose and truncation"""
+    try:
+        evaluation = extract_json(text)
+    except ValueError:
+        evaluation = None
+    if not isinstance(evaluation, dict) or "total_score" not in evaluation:
+        LLM_PARSE_FAILURES.inc(mode=mode, call=call)
+        raise ValueError("Model output did not contain a scoring object")
+    return evaluation
+
+def local_fallback_evaluation(user_text, context_text, mode, metrics=None):
+    """Provisional score computed without the LLM, used while it is unavailable."""
+    if mode == "repetition":
+        evaluation = repetition_scorer.estimate_repetition(user_text, context_text, metrics)
+    else:
+        words = (user_text or "").split()
+        # Length and lexical variety are all we can judge locally; relevance needs the model
+        coverage = min(len(words) / 80, 1.0)
+        variety = len({w.lower() for w in words}) / len(words) if words else 0
+        evaluation = {
+            "relevance_score": round(15 * coverage),
+            "grammar_score": round(15 * coverage),
+            "vocabulary_score": round(25 * variety * coverage),
+            "coherence_score": round(15 * coverage),
+            "feedback": "Provisional score based on the length and variety of your answer; "
+                        "detailed AI feedback is temporarily unavailable.",
+            "strengths": [],
+            "improvements": [],
         }
+        evaluation["total_score"] = (evaluation["relevance_score"] + evaluation["grammar_score"]
+                                     + evaluation["vocabulary_score"] + evaluation["coherence_score"])
+    evaluation["provisional"] = True
+    evaluation["error"] = "AI evaluation temporarily unavailable"
+    return evaluation
 
+def build_evaluation_prompt(user_text, context_text, mode, metrics=None):
+    """Rubric prompt for one evaluation, or None for an unknown mode"""
     if mode == "topic":
-        prompt = f"""You are an English language evaluator. Evaluate the following spoken response on the topic: "{context_text}"
+        return f"""You are an English language evaluator. Evaluate the following spoken response on the topic: "{context_text}"
 
 User's transcribed response: "{user_text}"
 
@@ -73,7 +197,7 @@ Only respond with valid JSON, no additional text."""
             duration = metrics.get('duration', 0)
             metrics_info = f"\nUser Performance Metrics:\n- Speaking Rate: {wps:.2f} words/second\n- Duration: {duration:.2f} seconds\n(Normal conversational pace is ~2-5 wps)\n"
 
-        prompt = f"""You are an English pronunciation and reading assistant. The user was asked to read/repeat the specific sentence: "{context_text}"
+        return f"""You are an English pronunciation and reading assistant. The user was asked to read/repeat the specific sentence: "{context_text}"
 
 User's transcribed response: "{user_text}"
 {metrics_info}
@@ -101,19 +225,102 @@ Provide your evaluation in the following JSON format:
 
 Only respond with valid JSON, no additional text."""
     
-    else:
-        return {"error": "Invalid mode"}
+    return None
+
+def _evaluate_prompt(request):
+    mode, prompt = request
+    response = get_llm().generate_content(prompt, evaluation_config(mode), mode=mode)
+    return parse_evaluation(response.text, mode)
+
+def _evaluate_prompts(requests):
+    """One Gemini call for several (mode, prompt) requests of one mode; None if the reply can't be split per item"""
+    mode = requests[0][0]
+    prompts = [prompt for _, prompt in requests]
+    tasks = "\n\n".join(f"### Task {i}\n{prompt}" for i, prompt in enumerate(prompts, 1))
+    batch_prompt = f"""You will receive {len(prompts)} independent evaluation tasks. Complete each one exactly as its own instructions say; do not let one task influence another.
+
+Respond with a single JSON array of {len(prompts)} objects, where element i is the JSON object requested by Task i, in order.
 
+{tasks}
+
+Only respond with the JSON array, no additional text."""
+    response = get_llm().generate_content(batch_prompt, evaluation_config(mode, batch=True), mode=mode, call="batch")
     try:
-        response = gemini_client.models.generate_content(
-            model='gemini-2.0-flash',
-            contents=prompt
-        )
+        evaluations = extract_json(response.text)
+    except ValueError:
+        evaluations = None
+    if not isinstance(evaluations, list) or not all(isinstance(e, dict) and "total_score" in e for e in evaluations):
+        LLM_PARSE_FAILURES.inc(mode=mode, call="batch")
+        return None
+    return evaluations
+
+def warm_up():
+    """Build the Gemini client and response schemas ahead of the first evaluation"""
+    if get_llm():
+        evaluation_config("topic")
+        evaluation_config("repetition")
+
+# Under load, evaluations arriving within a short window share one Gemini call
+batcher = MicroBatcher(_evaluate_prompt, _evaluate_prompts) if LLM_BATCHING and api_key else None
+
+def evaluate_speaking_response(user_text, context_text, mode="topic", metrics=None):
+    """
+    Evaluates a user's spoken response using Gemini.
+    
+    Args:
+        user_text (str): The transcribed text from the user.
+        context_text (str): The context (e.g., the topic or the target sentence).
+        mode (str): 'topic' for Module C, 'repetition' for Modules A/B.
         
-        cleaned_json = clean_json_response(response.text)
-        evaluation = json.loads(cleaned_json)
+    Returns:
+        dict: A dictionary containing scores and feedback.
+    """
+    started = time.monotonic()
+    try:
+        return _evaluate_speaking_response(user_text, context_text, mode, metrics)
+    finally:
+        EVALUATION_SECONDS.observe(time.monotonic() - started, mode=mode)
+
+def _evaluate_speaking_response(user_text, context_text, mode, metrics):
+    if mode == "repetition" and repetition_scorer.FAST_PATH_ENABLED:
+        # Clear-cut attempts (near-perfect or near-empty) never need the LLM
+        local = repetition_scorer.score_repetition(user_text, context_text, metrics)
+        if local is not None:
+            return local
+        repetition_scorer.SCORING_PATH.inc(path="llm")
+
+    llm = get_llm()
+    if not llm:
+        return {
+            "error": "Gemini API key not configured",
+            "feedback": "AI evaluation unavailable.",
+            "total_score": 0
+        }
+
+    prompt = build_evaluation_prompt(user_text, context_text, mode, metrics)
+    if prompt is None:
+        return {"error": "Invalid mode"}
+
+    request_key = evaluation_cache_key(mode, context_text, user_text, metrics)
+    if LLM_CACHE_ENABLED:
+        cached = evaluation_cache.get(request_key)
+        if cached is not None:
+            return cached
+
+    # Identical evaluations already in flight share that one Gemini call
+    return inflight_evaluations.do(
+        request_key, lambda: _generate_evaluation(prompt, request_key, user_text, context_text, mode, metrics))
+
+def _generate_evaluation(prompt, request_key, user_text, context_text, mode, metrics):
+    try:
+        evaluation = batcher.submit(mode, (mode, prompt)) if batcher else _evaluate_prompt((mode, prompt))
+        if LLM_CACHE_ENABLED and isinstance(evaluation, dict):
+            evaluation_cache.put(request_key, evaluation)
         return evaluation
 
+    except LLMUnavailable as e:
+        print(f"Gemini unavailable, using local fallback: {e}")
+        return local_fallback_evaluation(user_text, context_text, mode, metrics)
     except Exception as e:
         print(f"Gemini evaluation error: {e}")
         return {
@@ -121,3 +328,73 @@ Only respond with valid JSON, no additional text."""
             "feedback": "Could not generate AI feedback at this time.",
             "total_score": 0
         }
+
+def stream_speaking_evaluation(user_text, context_text, mode="topic", metrics=None):
+    """
+    Streams an evaluation while Gemini writes it.
+
+    Yields (event, data) pairs: ("score", {name: value}) as each sub-score
+    appears, ("feedback", {"text": delta}) as feedback text arrives, and
+    finally ("result", evaluation) with the same dict evaluate_speaking_response
+    would return.
+    """
+    if mode == "repetition" and repetition_scorer.FAST_PATH_ENABLED:
+        local = repetition_scorer.score_repetition(user_text, context_text, metrics)
+        if local is not None:
+            yield "result", local
+            return
+        repetition_scorer.SCORING_PATH.inc(path="llm")
+
+    llm = get_llm()
+    if not llm:
+        yield "result", {
+            "error": "Gemini API key not configured",
+            "feedback": "AI evaluation unavailable.",
+            "total_score": 0
+        }
+        return
+
+    prompt = build_evaluation_prompt(user_text, context_text, mode, metrics)
+    if prompt is None:
+        yield "result", {"error": "Invalid mode"}
+        return
+
+    request_key = evaluation_cache_key(mode, context_text, user_text, metrics)
+    if LLM_CACHE_ENABLED:
+        cached = evaluation_cache.get(request_key)
+        if cached is not None:
+            yield "result", cached
+            return
+
+    parser = IncrementalJSONParser()
+    scores_sent = set()
+    feedback_sent = 0
+    try:
+        for chunk in llm.generate_content_stream(prompt, evaluation_config(mode), mode=mode):
+            partial = parser.feed(chunk)
+            if not isinstance(partial, dict):
+                continue
+            for name, value in partial.items():
+                if name.endswith("_score") and name not in scores_sent and isinstance(value, (int, float)):
+                    scores_sent.add(name)
+                    yield "score", {name: value}
+            feedback = partial.get("feedback")
+            if isinstance(feedback, str) and len(feedback) > feedback_sent:
+                yield "feedback", {"text": feedback[feedback_sent:]}
+                feedback_sent = len(feedback)
+
+        evaluation = parse_evaluation(parser.text, mode, "stream")
+        if LLM_CACHE_ENABLED and isinstance(evaluation, dict):
+            evaluation_cache.put(request_key, evaluation)
+        yield "result", evaluation
+
+    except LLMUnavailable as e:
+        print(f"Gemini unavailable, using local fallback: {e}")
+        yield "result", local_fallback_evaluation(user_text, context_text, mode, metrics)
+    except Exception as e:
+        print(f"Gemini evaluation error: {e}")
+        yield "result", {
+            "error": str(e),
+            "feedback": "Could not generate AI feedback at this time.",
+            "total_score": 0
+        }
@@ -0,0 +1,377 @@
+import sys
+import argparse
+
+from db import connect
+from rollup import BACKFILL_SQL, BACKFILL_LOCK_SQL, SQLITE_BACKFILL_SQL
+
+# Versioned schema migrations, applied in order and recorded in schema_migrations.
+# Each entry is (version, name, statements, transactional). Non-transactional
+# migrations run statement by statement in autocommit mode, which is what
+# CREATE INDEX CONCURRENTLY requires; their statements must be idempotent so a
+# failed run can simply be retried.
+MIGRATIONS = [
+    (1, "create_users", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            username TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    ], True),
+    (2, "create_user_performance", [
+        """
+        CREATE TABLE IF NOT EXISTS user_performance (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            session_id TEXT NOT NULL,
+            module TEXT NOT NULL,
+            question_number INTEGER,
+            score REAL,
+            max_score REAL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+        """,
+    ], True),
+    # resolve_user_and_completed: WHERE user_id AND module -> DISTINCT question_number
+    # get_session_report:      WHERE user_id AND session_id GROUP BY module
+    # Both indexes carry the selected columns so the planner can answer from the index alone.
+    # The session index was dropped again in migration 6 once the report moved to the rollup.
+    (3, "index_user_performance_hot_queries", [
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_performance_user_module
+        ON user_performance (user_id, module, question_number);
+        """,
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_performance_user_session
+        ON user_performance (user_id, session_id, module) INCLUDE (score, max_score);
+        """,
+    ], False),
+    # Running aggregates read by get_session_report; see rollup.py
+    (4, "create_session_module_rollup", [
+        """
+        CREATE TABLE IF NOT EXISTS session_module_rollup (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            session_id TEXT NOT NULL,
+            module TEXT NOT NULL,
+            score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            max_score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            best_score REAL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, session_id, module)
+        );
+        """,
+        # Writers wait for the backfill so none of their rows is lost (see rollup.py)
+        BACKFILL_LOCK_SQL,
+        BACKFILL_SQL,
+    ], True),
+    # Keyset pagination for the progress history API: WHERE user_id ORDER BY (timestamp, id)
+    (5, "index_user_performance_history", [
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_performance_user_time
+        ON user_performance (user_id, timestamp, id);
+        """,
+    ], False),
+    # get_session_report reads session_module_rollup now; the index only slowed inserts
+    (6, "drop_index_user_performance_user_session", [
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_user_performance_user_session;",
+    ], False),
+]
+
+# The same schema versions for the embedded SQLite backend (storage.SQLiteStorage).
+# SQLite tracks the applied version in PRAGMA user_version.
+SQLITE_MIGRATIONS = [
+    (1, "create_users", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            username TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    ]),
+    (2, "create_user_performance", [
+        """
+        CREATE TABLE IF NOT EXISTS user_performance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            session_id TEXT NOT NULL,
+            module TEXT NOT NULL,
+            question_number INTEGER,
+            score REAL,
+            max_score REAL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+        """,
+    ]),
+    (3, "index_user_performance_hot_queries", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_performance_user_module
+        ON user_performance (user_id, module, question_number);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_performance_user_session
+        ON user_performance (user_id, session_id, module, score, max_score);
+        """,
+    ]),
+    (4, "create_session_module_rollup", [
+        """
+        CREATE TABLE IF NOT EXISTS session_module_rollup (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            session_id TEXT NOT NULL,
+            module TEXT NOT NULL,
+            score_sum REAL NOT NULL DEFAULT 0,
+            max_score_sum REAL NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            best_score REAL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, session_id, module)
+        );
+        """,
+        SQLITE_BACKFILL_SQL,
+    ]),
+    (5, "index_user_performance_history", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_performance_user_time
+        ON user_performance (user_id, timestamp, id);
+        """,
+    ]),
+    (6, "drop_index_user_performance_user_session", [
+        "DROP INDEX IF EXISTS idx_user_performance_user_session;",
+    ]),
+]
+
+# Queries whose plans must use an index; kept in sync with app.py
+HOT_QUERIES = {
+    "resolve_user_and_completed": ("""
+        SELECT u.id,
+               COALESCE(array_agg(DISTINCT p.question_number)
+                        FILTER (WHERE p.question_number IS NOT NULL), '{}')
+        FROM users u
+        LEFT JOIN user_performance p ON p.user_id = u.id AND p.module = %s
+        WHERE u.email = %s
+        GROUP BY u.id
+    """, "idx_user_performance_user_module"),
+    "get_session_report": ("""
+        SELECT module, score_sum / attempts AS avg_score, max_score_sum / attempts AS max_score, attempts
+        FROM session_module_rollup
+        WHERE user_id = %s AND session_id = %s AND attempts > 0
+        ORDER BY module
+    """, "session_module_rollup_pkey"),
+}
+
+# Arbitrary key so two deploys never run migrations at the same time
+MIGRATION_LOCK_KEY = 7224101
+
+
+def _ensure_migrations_table(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.commit()
+    cur.close()
+
+
+def applied_versions(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cur.fetchall()}
+    cur.close()
+    conn.commit()
+    return versions
+
+
+def _drop_invalid_indexes(conn):
+    """Remove indexes left INVALID by an interrupted CREATE INDEX CONCURRENTLY"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT c.relname FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        WHERE NOT i.indisvalid AND t.relname = 'user_performance'
+    """)
+    for (name,) in cur.fetchall():
+        print(f"Dropping invalid index {name} from an interrupted build...")
+        cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+    cur.close()
+
+
+def _apply(conn, version, name, statements, transactional):
+    cur = conn.cursor()
+    if transactional:
+        for statement in statements:
+            cur.execute(statement)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        conn.commit()
+    else:
+        conn.autocommit = True
+        try:
+            _drop_invalid_indexes(conn)
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        finally:
+            conn.autocommit = False
+    cur.close()
+
+
+def migrate(conn=None, target=None):
+    """Apply every pending migration up to `target` (default: latest)"""
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        _ensure_migrations_table(conn)
+        cur = conn.cursor()
+        # Session-level lock so it survives the autocommit switches below
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        conn.commit()
+        try:
+            done = applied_versions(conn)
+            for version, name, statements, transactional in MIGRATIONS:
+                if version in done or (target is not None and version > target):
+                    continue
+                print(f"Applying migration {version:04d}_{name}...")
+                try:
+                    _apply(conn, version, name, statements, transactional)
+                except Exception:
+                    conn.rollback()
+                    raise
+            print("Schema is up to date.")
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+            cur.close()
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def migrate_sqlite(conn):
+    """Apply pending SQLITE_MIGRATIONS to an open sqlite3 connection"""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, name, statements in SQLITE_MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Another process may have migrated while we waited for the write lock
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def status(conn=None):
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        _ensure_migrations_table(conn)
+        done = applied_versions(conn)
+        for version, name, _, _ in MIGRATIONS:
+            print(f"[{'x' if version in done else ' '}] {version:04d}_{name}")
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def check_query_plans(conn=None, users=200, rows_per_user=100):
+    """EXPLAIN the hot queries against a seeded dataset and assert they use their indexes.
+
+    The seed data is inserted inside a transaction that is always rolled back,
+    so this is safe to run against any database the migrations have been applied to.
+    Returns True when every hot query is served by its index.
+    """
+    own_conn = conn is None
+    conn = conn or connect()
+    ok = True
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO users (email, username, password_hash)
+            SELECT 'plan-check-' || g || '@example.invalid', 'plan-check', 'x'
+            FROM generate_series(1, %s) g
+            RETURNING id
+        """, (users,))
+        user_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("""
+            INSERT INTO user_performance (user_id, session_id, module, question_number, score, max_score)
+            SELECT u.id, 'session-' || (g %% 20), 'Module ' || chr(65 + (g %% 4)), g %% 25, (g %% 100), 100
+            FROM unnest(%s::int[]) AS u(id), generate_series(1, %s) g
+        """, (user_ids, rows_per_user))
+        cur.execute(BACKFILL_SQL)
+        cur.execute("ANALYZE user_performance")
+        cur.execute("ANALYZE session_module_rollup")
+
+        probe_user = user_ids[len(user_ids) // 2]
+        cur.execute("SELECT email FROM users WHERE id = %s", (probe_user,))
+        probe_email = cur.fetchone()[0]
+        params = {
+            "resolve_user_and_completed": ("Module B", probe_email),
+            "get_session_report": (probe_user, "session-3"),
+        }
+        for name, (query, index_name) in HOT_QUERIES.items():
+            cur.execute("EXPLAIN (FORMAT JSON) " + query, params[name])
+            plan = cur.fetchone()[0][0]["Plan"]
+            used = {node.get("Index Name") for node in _plan_nodes(plan)
+                    if node["Node Type"] in ("Index Scan", "Index Only Scan", "Bitmap Index Scan")}
+            if index_name in used:
+                print(f"OK   {name}: uses {index_name}")
+            else:
+                ok = False
+                node_types = sorted({node["Node Type"] for node in _plan_nodes(plan)})
+                print(f"FAIL {name}: expected {index_name}, plan nodes {node_types}")
+        cur.close()
+    finally:
+        conn.rollback()
+        if own_conn:
+            conn.close()
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    sub = parser.add_subparsers(dest="command")
+    up = sub.add_parser("migrate", help="apply pending migrations (default)")
+    up.add_argument("--target", type=int, help="stop after this version")
+    sub.add_parser("status", help="list migrations and whether they are applied")
+    check = sub.add_parser("check-plans", help="assert the hot queries use index scans on seeded data")
+    check.add_argument("--users", type=int, default=200)
+    check.add_argument("--rows-per-user", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        status()
+    elif args.command == "check-plans":
+        if not check_query_plans(users=args.users, rows_per_user=args.rows_per_user):
+            return 1
+    else:
+        migrate(target=getattr(args, "target", None))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,7 @@
 import random
-from jiwer import wer
-from dotenv import load_dotenv
+from repetition_scorer import precompute_targets
 import os
 
-load_dotenv()
-
 sentences = [
     "The sun rises in the east and sets in the west.",
     "Python is a powerful programming language used worldwide.",
@@ -23,6 +20,8 @@ sentences = [
     "Practice makes perfect, so never stop learning new things."
 ]
 
+precompute_targets(sentences)
+
 def run_moduleA(transcribed_text, duration, sentence_id):
     try:
         # Choose and remember the exact sentence and an id
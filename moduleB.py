@@ -1,9 +1,33 @@
 import random
-from jiwer import wer
-import asyncio
-import edge_tts
+import uuid
+import re
+from repetition_scorer import precompute_targets
 import os
 
+import config  # noqa: F401  # loads .env
+from audio_cache import AudioCache, audio_cache_key, is_valid_audio
+
+# Voice: en-GB-SoniaNeural (British Female)
+TTS_VOICE = os.getenv('TTS_VOICE', 'en-GB-SoniaNeural')
+TTS_RATE = os.getenv('TTS_RATE', '+0%')
+TTS_PITCH = os.getenv('TTS_PITCH', '+0Hz')
+# Voices and speaking rates clients may ask for; anything else is rejected so
+# callers can't fill the cache with arbitrary renderings
+TTS_VOICES = [v.strip() for v in os.getenv(
+    'TTS_VOICES', f'{TTS_VOICE},en-US-JennyNeural,en-IN-NeerjaNeural,en-AU-NatashaNeural').split(',') if v.strip()]
+TTS_RATES = [r.strip() for r in os.getenv('TTS_RATES', f'-30%,-15%,{TTS_RATE},+15%').split(',') if r.strip()]
+AUDIO_FOLDER = 'static/audio'
+# How long a request waits for a render before answering without audio
+TTS_TIMEOUT = float(os.getenv('TTS_TIMEOUT', '20'))
+
+audio_cache = AudioCache(
+    folder=AUDIO_FOLDER,
+    index_path=os.getenv('AUDIO_CACHE_INDEX', 'audio_cache.db'),
+    max_bytes=int(os.getenv('AUDIO_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+)
+
+_RATE = re.compile(r'^([+-]?)(\d+)%?$')
+
 sentences = [
     "The sun rises in the east and sets in the west.",
     "Python is a powerful programming language used worldwide.",
@@ -21,45 +45,109 @@ sentences = [
     "The internet has revolutionized communication and information sharing."
 ]
 
-def generate_audio_for_sentence(sentence_id, output_folder='static/audio'):
+precompute_targets(sentences)
+
+def resolve_voice(voice=None):
+    """Requested voice, or the default; raises ValueError for voices not in TTS_VOICES"""
+    if not voice:
+        return TTS_VOICE
+    if voice not in TTS_VOICES:
+        raise ValueError(f"Unsupported voice: {voice}")
+    return voice
+
+
+def resolve_rate(rate=None):
+    """Edge TTS rate string ('-15%') from '-15%', '-15' or an int; raises ValueError outside TTS_RATES"""
+    if rate is None or rate == '':
+        return TTS_RATE
+    match = _RATE.match(str(rate).strip())
+    normalized = f"{match.group(1) or '+'}{int(match.group(2))}%" if match else None
+    if normalized == '-0%':
+        normalized = '+0%'
+    if normalized not in TTS_RATES:
+        raise ValueError(f"Unsupported rate: {rate}")
+    return normalized
+
+
+async def synthesize(text, voice, rate, pitch, filepath):
+    """Render `text` to an MP3 at filepath with Edge TTS.
+
+    Audio is written to a temp file and published with an atomic rename, so
+    readers (and other worker processes) never see a half-written MP3.
+    """
+    # Imported here: edge_tts pulls in aiohttp and is only needed on a cache miss
+    import edge_tts
+    tmp_path = f"{filepath}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
+        await communicate.save(tmp_path)
+        if not is_valid_audio(tmp_path):
+            raise ValueError("Edge TTS returned no usable audio")
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+async def _synthesize_into_cache(text, voice, rate, pitch, key):
+    await synthesize(text, voice, rate, pitch, audio_cache.path_for(key))
+    audio_cache.record(key, text, voice, rate, pitch)
+
+
+async def render_audio(text, voice=TTS_VOICE, rate=TTS_RATE, pitch=TTS_PITCH, force=False):
+    """Cache key of the rendering, synthesizing it first unless cached (or when force).
+
+    Concurrent callers for the same rendering share one synthesis.
+    """
+    key = audio_cache_key(text, voice, rate, pitch)
+    # Must run on the TTS loop: the check and the single-flight lookup happen
+    # without an await in between, so no second render can start in this process
+    if not force and audio_cache.contains(key):
+        return key
+    from tts_loop import inflight_renders
+    await inflight_renders.do(key, lambda: _synthesize_into_cache(text, voice, rate, pitch, key))
+    return key
+
+
+def audio_url(key):
+    return f"/static/audio/{key}.mp3"
+
+
+def generate_audio_for_sentence(sentence_id, voice=None, rate=None, pitch=None):
     """Generate TTS audio for a sentence using Edge TTS
     
     Args:
         sentence_id: Index of the sentence
-        output_folder: Folder to save audio files
+        voice: Edge TTS voice name (default TTS_VOICE)
+        rate: Speaking rate such as '-15%' (default TTS_RATE)
+        pitch: Pitch offset such as '+0Hz' (default TTS_PITCH)
         
     Returns:
         Path to the generated audio file (relative to static folder)
     """
     try:
         # Create output folder if it doesn't exist
-        os.makedirs(output_folder, exist_ok=True)
+        os.makedirs(AUDIO_FOLDER, exist_ok=True)
 
         if sentence_id < 0 or sentence_id >= len(sentences):
              return None
 
         sentence = sentences[sentence_id]
-        filename = f"sentence_{sentence_id}.mp3"
-        filepath = os.path.join(output_folder, filename)
+        voice, rate, pitch = voice or TTS_VOICE, rate or TTS_RATE, pitch or TTS_PITCH
 
-        # Check if audio already exists
-        if os.path.exists(filepath):
-            return f"/static/audio/{filename}"
+        # Files are addressed by (text, voice, rate, pitch), so an edited sentence gets fresh audio
+        key = audio_cache_key(sentence, voice, rate, pitch)
+        if audio_cache.lookup(key):
+            return audio_url(key)
 
-        # Generate TTS audio using Edge TTS
-        # Voice: en-GB-SoniaNeural (British Female) 
-        voice = "en-GB-SoniaNeural"
-        
-        async def _save_audio():
-            communicate = edge_tts.Communicate(sentence, voice)
-            await communicate.save(filepath)
-            
-        asyncio.run(_save_audio())
+        # Rendered on the shared background loop instead of a fresh asyncio.run() per request
+        from tts_loop import tts_loop
+        tts_loop.run(render_audio(sentence, voice, rate, pitch), timeout=TTS_TIMEOUT)
 
-        return f"/static/audio/{filename}"
+        return audio_url(key)
 
     except Exception as e:
-        print(f"Error generating audio: {str(e)}")
+        print(f"Error generating audio: {str(e) or type(e).__name__}")
         return None
 
 def run_moduleB(transcribed_text, sentence_id, duration=0):
@@ -1,9 +1,6 @@
 import random
 import os
-from dotenv import load_dotenv
-from llm_utils import evaluate_speaking_response
-
-load_dotenv()
+from llm_utils import evaluate_speaking_response, stream_speaking_evaluation
 
 topics = [
     "The importance of renewable energy in today's world",
@@ -18,43 +15,58 @@ topics = [
     "Your dream vacation destination and why"
 ]
 
+def resolve_topic(topic_id):
+    """Topic text for an id, or the general topic when the id is missing or out of range"""
+    if topic_id is not None:
+        try:
+            topic_id = int(topic_id)
+            if 0 <= topic_id < len(topics):
+                return topics[topic_id]
+        except (TypeError, ValueError):
+            pass
+    return "General Topic"
+
+def build_result(topic, user_text, evaluation):
+    return {
+        "success": True,
+        "topic": topic,
+        "transcription": user_text,
+        "score": evaluation.get("total_score", 0),
+        "relevance_score": evaluation.get("relevance_score", 0),
+        "grammar_score": evaluation.get("grammar_score", 0),
+        "vocabulary_score": evaluation.get("vocabulary_score", 0),
+        "coherence_score": evaluation.get("coherence_score", 0),
+        "feedback": evaluation.get("feedback", "No feedback available."),
+        "strengths": evaluation.get("strengths", []),
+        "improvements": evaluation.get("improvements", [])
+    }
+
 def run_moduleC(transcribed_text, topic_id=None):
     """Process text for Module C - Topic Speaking"""
     try:
-        topic = "General Topic"
-        if topic_id is not None:
-             try:
-                 topic_id = int(topic_id)
-                 if 0 <= topic_id < len(topics):
-                     topic = topics[topic_id]
-             except:
-                 pass
-        
+        topic = resolve_topic(topic_id)
         user_text = transcribed_text.strip()
 
         # Use shared LLM utility
         evaluation = evaluate_speaking_response(user_text, topic, mode="topic")
-
-        if "error" in evaluation and "gemini" in str(evaluation.get("error", "")).lower():
-             # Fallback if AI fails? Or just return the error
-             pass
-
-        return {
-            "success": True,
-            "topic": topic,
-            "transcription": user_text,
-            "score": evaluation.get("total_score", 0),
-            "relevance_score": evaluation.get("relevance_score", 0),
-            "grammar_score": evaluation.get("grammar_score", 0),
-            "vocabulary_score": evaluation.get("vocabulary_score", 0),
-            "coherence_score": evaluation.get("coherence_score", 0),
-            "feedback": evaluation.get("feedback", "No feedback available."),
-            "strengths": evaluation.get("strengths", []),
-            "improvements": evaluation.get("improvements", [])
-        }
+        return build_result(topic, user_text, evaluation)
 
     except Exception as e:
         return {
             "error": str(e),
             "success": False
         }
+
+def stream_moduleC(transcribed_text, topic_id=None):
+    """Like run_moduleC, but yields partial ("score"/"feedback") events before the final ("result", dict)"""
+    topic = resolve_topic(topic_id)
+    user_text = transcribed_text.strip()
+    try:
+        for event, data in stream_speaking_evaluation(user_text, topic, mode="topic"):
+            if event == "result":
+                yield "result", build_result(topic, user_text, data)
+            else:
+                yield event, data
+    except Exception as e:
+        print(f"ERROR in stream_moduleC: {e}")
+        yield "result", {"error": str(e), "success": False}
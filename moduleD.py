@@ -1,5 +1,6 @@
 import random
 from typing import List, Dict, Optional, Union
+from completed_cache import to_mask, sample_unseen
 
 # Extended question bank - Focused on Tenses, Prepositions, Articles, Adverbs
 questions_bank = [
@@ -43,23 +44,19 @@ questions_bank = [
     {"sentence": "The cat jumped ___ the wall.", "answer": "over", "category": "prepositions_movement"}
 ]
 
-def get_quiz(num_questions: int = 5, excluded_indices: List[int] = None) -> Dict:
-    """Generate a new quiz with specified number of questions, excluding completed ones"""
+def get_quiz(num_questions: int = 5, excluded_indices: List[int] = None, completed_mask: int = 0) -> Dict:
+    """Generate a new quiz with specified number of questions, excluding completed ones
+
+    Completed questions can be given as a list of indices or as a bitset
+    (bit i set = questions_bank[i] already answered).
+    """
     
     try:
-        if excluded_indices is None:
-            excluded_indices = []
+        if excluded_indices:
+            completed_mask |= to_mask(excluded_indices)
             
-        # Filter available indices
-        available_indices = [i for i in range(len(questions_bank)) if i not in excluded_indices]
-        
-        # If run out of questions, reset (use all indices) or handle gracefullly. 
-        # For now, if fewer than required, take what's left or reset if empty.
-        if not available_indices:
-             available_indices = list(range(len(questions_bank)))
-        
-        # Sample directly from available indices
-        selected_indices = random.sample(available_indices, min(num_questions, len(available_indices)))
+        # Sample from the unseen indices; if none are left, reset to the whole bank
+        selected_indices = sample_unseen(completed_mask, len(questions_bank), num_questions)
 
         quiz_questions = []
         for i, idx in enumerate(selected_indices):
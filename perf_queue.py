@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import atexit
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+QUEUE_DEPTH = metrics.Gauge('performance_queue_depth', 'Performance rows waiting to be flushed')
+SPOOLED_ROWS = metrics.Gauge('performance_spool_rows', 'Performance rows parked in the local spool')
+ROWS_WRITTEN = metrics.Counter('performance_rows_written_total', 'Performance rows written to the database', labels=('source',))
+ROWS_SPOOLED = metrics.Counter('performance_rows_spooled_total', 'Performance rows diverted to the local spool')
+ROWS_DEAD_LETTERED = metrics.Counter('performance_rows_dead_lettered_total',
+                                     'Performance rows the database rejected, set aside in the dead-letter table')
+FLUSH_FAILURES = metrics.Counter('performance_flush_failures_total', 'Batch writes that failed and were spooled')
+FLUSH_SECONDS = metrics.Histogram('performance_flush_seconds', 'Time to write one batch of performance rows')
+
+
+class PerformanceWriteQueue:
+    """Write-behind buffer for user_performance rows.
+
+    Request handlers enqueue rows and return immediately; a background thread
+    writes them in batches once `batch_size` rows are waiting or
+    `flush_interval` seconds have passed. Batches that cannot be written
+    (database down, pool exhausted) are appended to a local SQLite spool and
+    replayed oldest-first once writes succeed again. While anything is spooled,
+    new rows are queued behind it so the database sees them in order.
+
+    Errors listed in `permanent_errors` mean the rows themselves were
+    rejected. The batch is split until the offending rows are isolated; those
+    go to a dead-letter table in the spool file and everything else is written.
+
+    The spool file may be shared by several worker processes: replay claims
+    rows under an exclusive SQLite transaction, so each row is written once.
+    """
+
+    def __init__(self, write_rows, spool_path='performance_spool.db', batch_size=100,
+                 flush_interval=0.5, max_queue=10000, retry_interval=5.0, permanent_errors=(),
+                 claim_timeout=300.0):
+        self._write_rows = write_rows
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.permanent_errors = tuple(permanent_errors)
+        # Claims older than this belong to a worker that died mid-replay
+        self.claim_timeout = claim_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._spool_conn = None
+        self._spool_pid = None
+        self._next_retry = 0.0
+        self._thread = None
+        self._thread_pid = None
+        self._stopping = threading.Event()
+
+        QUEUE_DEPTH.set_callback(self._queue.qsize)
+        SPOOLED_ROWS.set_callback(self._spool_count)
+
+    # ----- public API -----
+
+    def enqueue(self, rows):
+        """Queue rows for writing; never blocks the caller on the database"""
+        self._ensure_thread()
+        overflow = []
+        for row in rows:
+            try:
+                self._queue.put_nowait(tuple(row))
+            except queue.Full:
+                overflow.append(tuple(row))
+        if overflow:
+            # Queue is saturated; park the rows on disk rather than dropping them
+            self._spool(overflow)
+
+    def flush(self, timeout=10.0):
+        """Synchronously write (or spool) everything enqueued so far.
+
+        Also waits, up to `timeout` seconds, for the batch the flusher thread
+        may already have taken off the queue.
+        """
+        with self._flush_lock:
+            while True:
+                batch = self._drain_nowait(self.batch_size)
+                if not batch:
+                    break
+                self._flush_batch(batch)
+            self._next_retry = 0.0
+            self._replay_spool()
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._queue.all_tasks_done.wait(remaining)
+
+    def stop(self):
+        """Stop the flusher thread and flush what is left"""
+        self._stopping.set()
+        if self._thread is not None and self._thread_pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval * 4)
+        self.flush()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'spooled': self._spool_count(),
+            'written': ROWS_WRITTEN.value(source='queue') + ROWS_WRITTEN.value(source='spool'),
+            'dead_lettered': ROWS_DEAD_LETTERED.value(),
+            'flush_failures': FLUSH_FAILURES.value(),
+        }
+
+    # ----- flusher thread -----
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._flush_lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='performance-writer', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect()
+            try:
+                with self._flush_lock:
+                    self._flush_batch(batch)
+            except Exception as e:
+                print(f"Performance writer error: {e}")
+
+    def _collect(self):
+        """Block until a full batch is waiting or the flush interval elapses"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain_nowait(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush_batch(self, batch):
+        try:
+            if self._spool_count():
+                # Keep ordering: new rows line up behind what is already spooled
+                if batch:
+                    self._spool(batch)
+                self._replay_spool()
+                return
+            if not batch:
+                return
+            start = time.monotonic()
+            unwritten, error = self._write(batch, 'queue')
+            if unwritten:
+                print(f"Error saving performance batch, spooling {len(unwritten)} rows: {error}")
+                FLUSH_FAILURES.inc()
+                self._next_retry = time.monotonic() + self.retry_interval
+                self._spool(unwritten)
+            else:
+                FLUSH_SECONDS.observe(time.monotonic() - start)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, rows, source):
+        """Write rows, isolating any the database rejects.
+
+        Returns (unwritten, error): the trailing rows left unwritten by a
+        transient failure, and that failure. Rows before them were written or
+        dead-lettered.
+        """
+        try:
+            self._write_rows(rows)
+        except self.permanent_errors as e:
+            if len(rows) == 1:
+                self._dead_letter(rows[0], e)
+                return [], None
+            mid = len(rows) // 2
+            unwritten, error = self._write(rows[:mid], source)
+            if unwritten:
+                return unwritten + list(rows[mid:]), error
+            return self._write(rows[mid:], source)
+        except Exception as e:
+            return list(rows), e
+        ROWS_WRITTEN.inc(len(rows), source=source)
+        return [], None
+
+    # ----- local spool -----
+
+    def _spool_db(self):
+        if self._spool_conn is None or self._spool_pid != os.getpid():
+            # Autocommit: claims are made in explicit BEGIN IMMEDIATE transactions
+            conn = sqlite3.connect(self.spool_path, check_same_thread=False, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS performance_spool (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    row TEXT NOT NULL,
+                    claimed_by INTEGER,
+                    claimed_at REAL
+                )
+            """)
+            columns = {info[1] for info in conn.execute("PRAGMA table_info(performance_spool)")}
+            if 'claimed_by' not in columns:
+                conn.execute("ALTER TABLE performance_spool ADD COLUMN claimed_by INTEGER")
+                conn.execute("ALTER TABLE performance_spool ADD COLUMN claimed_at REAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS performance_dead_letter (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    row TEXT NOT NULL,
+                    error TEXT NOT NULL,
+                    failed_at REAL NOT NULL
+                )
+            """)
+            self._spool_conn = conn
+            self._spool_pid = os.getpid()
+        return self._spool_conn
+
+    @contextmanager
+    def _transaction(self):
+        """Spool connection inside BEGIN IMMEDIATE ... COMMIT; the caller holds _spool_lock"""
+        conn = self._spool_db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _spool_count(self):
+        """Rows waiting in the spool, across every process sharing the file"""
+        if self._spool_conn is None and not os.path.exists(self.spool_path):
+            return 0
+        with self._spool_lock:
+            try:
+                return self._spool_db().execute("SELECT COUNT(*) FROM performance_spool").fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"Performance spool error: {e}")
+                return 0
+
+    def _spool(self, rows):
+        with self._spool_lock, self._transaction() as conn:
+            conn.executemany("INSERT INTO performance_spool (row) VALUES (?)",
+                             [(json.dumps(list(row), default=str),) for row in rows])
+        ROWS_SPOOLED.inc(len(rows))
+
+    def _dead_letter(self, row, error):
+        print(f"Performance row rejected by the database, moved to dead-letter table: {row}: {error}")
+        with self._spool_lock:
+            self._spool_db().execute("INSERT INTO performance_dead_letter (row, error, failed_at) VALUES (?, ?, ?)",
+                                     (json.dumps(list(row), default=str), str(error), time.time()))
+        ROWS_DEAD_LETTERED.inc()
+
+    def _claim_chunk(self):
+        """Claim the oldest unclaimed spooled rows for this process"""
+        pid, now = os.getpid(), time.time()
+        with self._spool_lock, self._transaction() as conn:
+            chunk = conn.execute("""
+                SELECT id, row FROM performance_spool
+                WHERE claimed_by IS NULL OR claimed_by = ? OR claimed_at < ?
+                ORDER BY id LIMIT ?
+            """, (pid, now - self.claim_timeout, self.batch_size)).fetchall()
+            conn.executemany("UPDATE performance_spool SET claimed_by = ?, claimed_at = ? WHERE id = ?",
+                             [(pid, now, row_id) for row_id, _ in chunk])
+        return chunk
+
+    def _replay_spool(self):
+        """Write spooled rows back in insertion order until the spool is empty or a write fails"""
+        if time.monotonic() < self._next_retry:
+            return
+        while True:
+            chunk = self._claim_chunk()
+            if not chunk:
+                break
+            rows = [tuple(json.loads(row)) for _, row in chunk]
+            unwritten, error = self._write(rows, 'spool')
+            done = [(row_id,) for row_id, _ in chunk[:len(chunk) - len(unwritten)]]
+            with self._spool_lock, self._transaction() as conn:
+                conn.executemany("DELETE FROM performance_spool WHERE id = ?", done)
+                if unwritten:
+                    conn.execute("UPDATE performance_spool SET claimed_by = NULL, claimed_at = NULL "
+                                 "WHERE claimed_by = ?", (os.getpid(),))
+            if unwritten:
+                print(f"Performance spool replay failed, retrying in {self.retry_interval}s: {error}")
+                FLUSH_FAILURES.inc()
+                self._next_retry = time.monotonic() + self.retry_interval
+                return
+
+
+def register_shutdown_flush(write_queue):
+    """Flush (or spool) pending rows when the interpreter exits"""
+    atexit.register(write_queue.stop)
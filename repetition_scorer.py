@@ -0,0 +1,170 @@
+import os
+import re
+from functools import lru_cache
+
+import config  # noqa: F401  # loads .env
+
+import metrics
+
+# Word error rate at or below which an attempt is scored locally as a good reading
+FAST_PASS_WER = float(os.getenv('REPETITION_FAST_PASS_WER', '0.1'))
+# Share of the target's words missed (substituted or dropped) at or above which
+# an attempt is scored locally as a miss. Extra words don't count: a repeated
+# or padded reading still covers the sentence and goes to the LLM instead.
+FAST_FAIL_MISSED = float(os.getenv('REPETITION_FAST_FAIL_MISSED', '0.8'))
+FAST_PATH_ENABLED = os.getenv('REPETITION_FAST_PATH', '1') != '0'
+
+SCORING_PATH = metrics.Counter('repetition_scoring_total', 'Repetition attempts by scoring path',
+                               labels=('path',))
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+
+
+def tokenize(text):
+    """Lowercase words with punctuation dropped, matching the 'ignore case and punctuation' rule"""
+    return tuple(_NON_WORD.sub(" ", (text or "").lower()).split())
+
+
+@lru_cache(maxsize=512)
+def target_tokens(sentence):
+    return tokenize(sentence)
+
+
+def precompute_targets(sentences):
+    """Tokenise a sentence bank up front so scoring never re-normalises a target"""
+    for sentence in sentences:
+        target_tokens(sentence)
+
+
+def align(reference, hypothesis):
+    """Word-level edit alignment; returns (substitutions, deletions, insertions, missing_words)"""
+    rows, cols = len(reference) + 1, len(hypothesis) + 1
+    cost = [[0] * cols for _ in range(rows)]
+    for i in range(rows):
+        cost[i][0] = i
+    for j in range(cols):
+        cost[0][j] = j
+    for i in range(1, rows):
+        for j in range(1, cols):
+            if reference[i - 1] == hypothesis[j - 1]:
+                cost[i][j] = cost[i - 1][j - 1]
+            else:
+                cost[i][j] = 1 + min(cost[i - 1][j - 1], cost[i - 1][j], cost[i][j - 1])
+
+    subs = dels = ins = 0
+    missing = []
+    i, j = rows - 1, cols - 1
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and reference[i - 1] == hypothesis[j - 1] and cost[i][j] == cost[i - 1][j - 1]:
+            i, j = i - 1, j - 1
+        elif i > 0 and j > 0 and cost[i][j] == cost[i - 1][j - 1] + 1:
+            subs += 1
+            missing.append(reference[i - 1])
+            i, j = i - 1, j - 1
+        elif i > 0 and cost[i][j] == cost[i - 1][j] + 1:
+            dels += 1
+            missing.append(reference[i - 1])
+            i -= 1
+        else:
+            ins += 1
+            j -= 1
+    missing.reverse()
+    return subs, dels, ins, missing
+
+
+def _fluency_points(metrics_info):
+    """0-30 pacing score from words/second, using the same bands as the LLM prompt"""
+    if not metrics_info or "wps" not in metrics_info:
+        return 30, None
+    wps = metrics_info.get("wps", 0) or 0
+    if wps < 1.5:
+        return round(30 * wps / 1.5), "Try to speak a little faster and more smoothly."
+    if wps > 4:
+        return max(0, round(30 - (wps - 4) * 10)), "Slow down slightly so every word comes through clearly."
+    return 30, None
+
+
+def score_repetition(user_text, target_sentence, metrics_info=None):
+    """Score clear-cut repetition attempts locally.
+
+    Returns an evaluation dict shaped like the LLM's repetition response when
+    the attempt is near-perfect or misses most of the sentence, otherwise
+    None so the caller can fall back to the LLM.
+    """
+    reference = target_tokens(target_sentence)
+    hypothesis = tokenize(user_text)
+    if not reference:
+        return None
+
+    subs, dels, ins, missing = align(reference, hypothesis)
+    error_rate = (subs + dels + ins) / len(reference)
+    missed_rate = (subs + dels) / len(reference)
+
+    if hypothesis and error_rate <= FAST_PASS_WER:
+        match = max(0.0, 1 - error_rate)
+        fluency, pace_tip = _fluency_points(metrics_info)
+        accuracy, pronunciation = round(40 * match), round(30 * match)
+        improvements = []
+        if missing:
+            improvements.append(f"Watch these words: {', '.join(missing)}.")
+        if pace_tip:
+            improvements.append(pace_tip)
+        feedback = "Excellent! You read the sentence accurately."
+        if missing:
+            feedback = "Great job! You read the sentence almost perfectly."
+        SCORING_PATH.inc(path="fast_pass")
+        return {
+            "accuracy_score": accuracy,
+            "pronunciation_score": pronunciation,
+            "fluency_score": fluency,
+            "total_score": accuracy + pronunciation + fluency,
+            "feedback": f"{feedback} {pace_tip}" if pace_tip else feedback,
+            "strengths": ["Accurate word recognition", "Clear pronunciation"],
+            "improvements": improvements,
+            "word_error_rate": round(error_rate, 3),
+        }
+
+    if not hypothesis or missed_rate >= FAST_FAIL_MISSED:
+        match = 1 - missed_rate
+        accuracy, pronunciation = round(40 * match), round(30 * match)
+        if hypothesis:
+            feedback = "Your response didn't match the sentence closely. Listen again and repeat it word by word."
+        else:
+            feedback = "We couldn't hear a response. Make sure your microphone is on and read the sentence aloud."
+        SCORING_PATH.inc(path="fast_fail")
+        return {
+            "accuracy_score": accuracy,
+            "pronunciation_score": pronunciation,
+            "fluency_score": 0,
+            "total_score": accuracy + pronunciation,
+            "feedback": feedback,
+            "strengths": [],
+            "improvements": ["Read the full sentence aloud", "Speak clearly and at a steady pace"],
+            "word_error_rate": round(min(error_rate, 1.0), 3),
+        }
+
+    return None
+
+
+def estimate_repetition(user_text, target_sentence, metrics_info=None):
+    """Provisional word-accuracy score for any attempt, used when the LLM is unavailable"""
+    reference = target_tokens(target_sentence)
+    hypothesis = tokenize(user_text)
+    subs, dels, ins, missing = align(reference, hypothesis)
+    error_rate = min((subs + dels + ins) / len(reference), 1.0) if reference else 1.0
+    match = 1 - error_rate
+    fluency, pace_tip = _fluency_points(metrics_info) if hypothesis else (0, None)
+    accuracy, pronunciation, fluency = round(40 * match), round(30 * match), round(fluency * match)
+    improvements = [f"Watch these words: {', '.join(missing)}."] if missing else []
+    if pace_tip:
+        improvements.append(pace_tip)
+    return {
+        "accuracy_score": accuracy,
+        "pronunciation_score": pronunciation,
+        "fluency_score": fluency,
+        "total_score": accuracy + pronunciation + fluency,
+        "feedback": "Provisional score based on word accuracy; detailed AI feedback is temporarily unavailable.",
+        "strengths": [],
+        "improvements": improvements,
+        "word_error_rate": round(error_rate, 3),
+    }
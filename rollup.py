@@ -0,0 +1,231 @@
+import os
+import sys
+import sqlite3
+import argparse
+
+from db import connect
+
+# session_module_rollup keeps running aggregates per (user, session, module) so
+# the performance report is a primary-key read instead of a GROUP BY over raw rows.
+# It is updated in the same transaction as every user_performance insert.
+
+ROLLUP_UPSERT_SQL = """
+    INSERT INTO session_module_rollup (user_id, session_id, module, score_sum, max_score_sum, attempts, best_score)
+    VALUES %s
+    ON CONFLICT (user_id, session_id, module) DO UPDATE SET
+        score_sum = session_module_rollup.score_sum + EXCLUDED.score_sum,
+        max_score_sum = session_module_rollup.max_score_sum + EXCLUDED.max_score_sum,
+        attempts = session_module_rollup.attempts + EXCLUDED.attempts,
+        best_score = GREATEST(session_module_rollup.best_score, EXCLUDED.best_score),
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Recomputes rollups from raw rows, overwriting whatever is stored. Not safe on
+# its own while the app is writing: under READ COMMITTED a row committed after
+# this statement's snapshot has its delta overwritten by the EXCLUDED values.
+# Always run it after BACKFILL_LOCK_SQL in the same transaction.
+BACKFILL_SQL = """
+    INSERT INTO session_module_rollup (user_id, session_id, module, score_sum, max_score_sum, attempts, best_score)
+    SELECT user_id, session_id, module,
+           COALESCE(SUM(score), 0), COALESCE(SUM(max_score), 0), COUNT(*), MAX(score)
+    FROM user_performance
+    GROUP BY user_id, session_id, module
+    ON CONFLICT (user_id, session_id, module) DO UPDATE SET
+        score_sum = EXCLUDED.score_sum,
+        max_score_sum = EXCLUDED.max_score_sum,
+        attempts = EXCLUDED.attempts,
+        best_score = EXCLUDED.best_score,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Holds off writers (their ROW EXCLUSIVE lock conflicts with SHARE) until the
+# backfill commits; readers, including the report, carry on.
+BACKFILL_LOCK_SQL = "LOCK TABLE user_performance IN SHARE MODE"
+
+# SQLite variant; run inside BEGIN IMMEDIATE, which serializes it with writers.
+# WHERE true disambiguates ON CONFLICT from a join constraint in SQLite.
+SQLITE_BACKFILL_SQL = """
+    INSERT INTO session_module_rollup (user_id, session_id, module, score_sum, max_score_sum, attempts, best_score)
+    SELECT user_id, session_id, module,
+           COALESCE(SUM(score), 0), COALESCE(SUM(max_score), 0), COUNT(*), MAX(score)
+    FROM user_performance
+    WHERE true
+    GROUP BY user_id, session_id, module
+    ON CONFLICT (user_id, session_id, module) DO UPDATE SET
+        score_sum = excluded.score_sum,
+        max_score_sum = excluded.max_score_sum,
+        attempts = excluded.attempts,
+        best_score = excluded.best_score,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Rollups left behind with no raw rows (e.g. rows deleted by hand); valid on both backends
+ORPHAN_ROLLUPS_SQL = """
+    DELETE FROM session_module_rollup
+    WHERE NOT EXISTS (SELECT 1 FROM user_performance p
+                      WHERE p.user_id = session_module_rollup.user_id
+                        AND p.session_id = session_module_rollup.session_id
+                        AND p.module = session_module_rollup.module)
+"""
+
+CHECK_SQL = """
+    WITH raw AS (
+        SELECT user_id, session_id, module,
+               COALESCE(SUM(score), 0) AS score_sum, COALESCE(SUM(max_score), 0) AS max_score_sum,
+               COUNT(*) AS attempts, MAX(score) AS best_score
+        FROM user_performance
+        GROUP BY user_id, session_id, module
+    )
+    SELECT COALESCE(raw.user_id, r.user_id), COALESCE(raw.session_id, r.session_id), COALESCE(raw.module, r.module),
+           raw.attempts, r.attempts, raw.score_sum, r.score_sum, raw.max_score_sum, r.max_score_sum,
+           raw.best_score, r.best_score
+    FROM raw
+    FULL OUTER JOIN session_module_rollup r
+        ON r.user_id = raw.user_id AND r.session_id = raw.session_id AND r.module = raw.module
+    WHERE raw.user_id IS NULL OR r.user_id IS NULL
+       OR raw.attempts <> r.attempts
+       OR ABS(raw.score_sum - r.score_sum) > %(tolerance)s
+       OR ABS(raw.max_score_sum - r.max_score_sum) > %(tolerance)s
+       OR raw.best_score IS DISTINCT FROM r.best_score
+"""
+
+# SQLite variant: the FULL OUTER JOIN is spelled as a LEFT JOIN plus the
+# rollups with no raw rows, which works on SQLite versions before 3.39.
+SQLITE_CHECK_SQL = """
+    WITH raw AS (
+        SELECT user_id, session_id, module,
+               COALESCE(SUM(score), 0) AS score_sum, COALESCE(SUM(max_score), 0) AS max_score_sum,
+               COUNT(*) AS attempts, MAX(score) AS best_score
+        FROM user_performance
+        GROUP BY user_id, session_id, module
+    )
+    SELECT raw.user_id, raw.session_id, raw.module,
+           raw.attempts, r.attempts, raw.score_sum, r.score_sum, raw.max_score_sum, r.max_score_sum,
+           raw.best_score, r.best_score
+    FROM raw
+    LEFT JOIN session_module_rollup r
+        ON r.user_id = raw.user_id AND r.session_id = raw.session_id AND r.module = raw.module
+    WHERE r.user_id IS NULL
+       OR raw.attempts <> r.attempts
+       OR ABS(raw.score_sum - r.score_sum) > :tolerance
+       OR ABS(raw.max_score_sum - r.max_score_sum) > :tolerance
+       OR raw.best_score IS NOT r.best_score
+    UNION ALL
+    SELECT r.user_id, r.session_id, r.module,
+           NULL, r.attempts, NULL, r.score_sum, NULL, r.max_score_sum, NULL, r.best_score
+    FROM session_module_rollup r
+    WHERE NOT EXISTS (SELECT 1 FROM user_performance p
+                      WHERE p.user_id = r.user_id AND p.session_id = r.session_id AND p.module = r.module)
+"""
+
+
+def aggregate_rows(rows):
+    """Collapse performance rows into one rollup delta per (user, session, module)
+
+    Rows are (user_id, session_id, module, question_number, score, max_score, ...).
+    Pre-aggregating keeps the upsert to one row per key (ON CONFLICT cannot touch
+    a row twice) and sorting gives concurrent writers a consistent lock order.
+    """
+    deltas = {}
+    for user_id, session_id, module, _question_number, score, max_score, *_ in rows:
+        key = (user_id, session_id, module)
+        delta = deltas.get(key)
+        if delta is None:
+            delta = deltas[key] = [0.0, 0.0, 0, None]
+        delta[0] += score or 0
+        delta[1] += max_score or 0
+        delta[2] += 1
+        if score is not None and (delta[3] is None or score > delta[3]):
+            delta[3] = score
+    return [key + tuple(delta) for key, delta in sorted(deltas.items())]
+
+
+def upsert_rollups(cur, rows):
+    """Apply the rollup deltas for freshly inserted rows on the caller's cursor/transaction"""
+    deltas = aggregate_rows(rows)
+    if deltas:
+        from psycopg2.extras import execute_values
+        execute_values(cur, ROLLUP_UPSERT_SQL, deltas, page_size=max(len(deltas), 100))
+
+
+def _open(sqlite_path):
+    return sqlite3.connect(sqlite_path) if sqlite_path else connect()
+
+
+def backfill(conn=None, sqlite_path=None):
+    """Recompute every rollup from user_performance while holding off concurrent writers.
+
+    Works on a Postgres connection (the default) or a SQLite one (sqlite_path).
+    """
+    own_conn = conn is None
+    conn = conn or _open(sqlite_path)
+    try:
+        cur = conn.cursor()
+        if isinstance(conn, sqlite3.Connection):
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(SQLITE_BACKFILL_SQL)
+        else:
+            cur.execute(BACKFILL_LOCK_SQL)
+            cur.execute(BACKFILL_SQL)
+        backfilled = cur.rowcount
+        cur.execute(ORPHAN_ROLLUPS_SQL)
+        print(f"Backfilled {backfilled} rollup rows, removed {cur.rowcount} orphaned ones.")
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def check(conn=None, tolerance=1e-3, limit=20, sqlite_path=None):
+    """Compare every rollup against the raw aggregates; returns the number of mismatched keys"""
+    own_conn = conn is None
+    conn = conn or _open(sqlite_path)
+    try:
+        cur = conn.cursor()
+        cur.execute(SQLITE_CHECK_SQL if isinstance(conn, sqlite3.Connection) else CHECK_SQL,
+                    {"tolerance": tolerance})
+        mismatches = cur.fetchall()
+        cur.close()
+        conn.rollback()
+    finally:
+        if own_conn:
+            conn.close()
+
+    for row in mismatches[:limit]:
+        user_id, session_id, module = row[:3]
+        print(f"MISMATCH user={user_id} session={session_id} module={module}: "
+              f"attempts raw={row[3]} rollup={row[4]}, score_sum raw={row[5]} rollup={row[6]}, "
+              f"max_score_sum raw={row[7]} rollup={row[8]}, best raw={row[9]} rollup={row[10]}")
+    if len(mismatches) > limit:
+        print(f"... and {len(mismatches) - limit} more")
+    if mismatches:
+        print(f"{len(mismatches)} rollup rows disagree with user_performance; run `python rollup.py backfill`.")
+    else:
+        print("Rollups are consistent with user_performance.")
+    return len(mismatches)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain session_module_rollup")
+    parser.add_argument('--backend', choices=('postgres', 'sqlite'),
+                        default=os.getenv('STORAGE_BACKEND', 'postgres').lower())
+    parser.add_argument('--sqlite-path', default=os.getenv('SQLITE_PATH', 'comms_local.db'))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill", help="recompute all rollups from user_performance")
+    chk = sub.add_parser("check", help="compare rollups with raw aggregates")
+    chk.add_argument("--tolerance", type=float, default=1e-3)
+    args = parser.parse_args(argv)
+
+    sqlite_path = args.sqlite_path if args.backend == 'sqlite' else None
+    if args.command == "backfill":
+        backfill(sqlite_path=sqlite_path)
+        return 0
+    return 1 if check(tolerance=args.tolerance, sqlite_path=sqlite_path) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+"""Development server entry point: python run.py
+
+Prefer this over `python app.py`. Spawned helper processes (the password
+hashing pool) re-import the main module, and this one does nothing on
+import, whereas app.py would open storage, run migrations and build its
+caches again in every worker.
+"""
+
+if __name__ == '__main__':
+    from app import app
+
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,203 @@
+import io
+import os
+import csv
+import sys
+import time
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import config  # noqa: F401  # loads .env
+from werkzeug.security import generate_password_hash
+
+from hashing import PASSWORD_HASH_METHOD
+from moduleA import sentences as moduleA_sentences
+from moduleB import sentences as moduleB_sentences
+from moduleC import topics as moduleC_topics
+from moduleD import questions_bank
+
+# Question bank sizes, read from the banks so seeded question numbers stay in range
+MODULE_BANK_SIZES = {
+    'Module A - Read & Speak': len(moduleA_sentences),
+    'Module B - Listen & Repeat': len(moduleB_sentences),
+    'Module C - Topic Speaking': len(moduleC_topics),
+    'Module D - Grammar Quiz': len(questions_bank),
+}
+
+
+def _geometric(rng, mean):
+    """Count >= 1 with the given mean; long-tailed like real usage"""
+    if mean <= 1:
+        return 1
+    return 1 + int(rng.expovariate(1.0 / (mean - 1)))
+
+
+def generate_users(count, tag, password_hash):
+    for n in range(count):
+        yield (f"seed-{tag}-{n}@example.test", f"seed user {n}", password_hash)
+
+
+def generate_performance(user_ids, rng, args, now):
+    """Performance history for each user: sessions spread over --days, several modules per session"""
+    modules = list(MODULE_BANK_SIZES)
+    weights = [float(w) for w in args.module_weights.split(',')] if args.module_weights else None
+    for user_id in user_ids:
+        skill = min(max(rng.gauss(args.score_mean, args.score_sd), 5), 100)
+        sessions = _geometric(rng, args.sessions)
+        start = now - timedelta(days=rng.uniform(0, args.days))
+        for s in range(sessions):
+            session_id = f"seed-{user_id}-{s}"
+            when = start + (now - start) * (s / sessions) + timedelta(minutes=rng.uniform(0, 120))
+            for module in rng.choices(modules, weights=weights, k=rng.randint(1, len(modules))):
+                bank = MODULE_BANK_SIZES[module]
+                for _ in range(_geometric(rng, args.attempts)):
+                    if module == 'Module D - Grammar Quiz':
+                        score = 100 if rng.random() * 100 < skill else 0
+                    else:
+                        score = round(min(max(rng.gauss(skill, 12), 0), 100), 1)
+                    when += timedelta(seconds=rng.uniform(20, 180))
+                    yield (user_id, session_id, module, rng.randrange(bank), score, 100,
+                           when.isoformat(sep=' '))
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class PostgresLoader:
+    """Bulk loads with COPY ... FROM STDIN, one chunk per transaction"""
+
+    def __init__(self):
+        from create_tables import create_tables
+        from db import connect
+        create_tables()
+        self.conn = connect()
+
+    def _copy(self, table, columns, rows):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+        cur = self.conn.cursor()
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.close()
+
+    def load_users(self, rows):
+        cur = self.conn.cursor()
+        # Reserve ids from the sequence up front so the rows can be COPYed with explicit ids
+        cur.execute("SELECT nextval(pg_get_serial_sequence('users', 'id')) FROM generate_series(1, %s)", (len(rows),))
+        ids = [row[0] for row in cur.fetchall()]
+        cur.close()
+        self._copy('users', ('id', 'email', 'username', 'password_hash'),
+                   [(user_id,) + row for user_id, row in zip(ids, rows)])
+        self.conn.commit()
+        return ids
+
+    def load_performance(self, rows):
+        self._copy('user_performance',
+                   ('user_id', 'session_id', 'module', 'question_number', 'score', 'max_score', 'timestamp'), rows)
+        self.conn.commit()
+
+    def finish(self):
+        from rollup import backfill
+        # COPY bypasses the app's write path, so rebuild rollups and planner stats once at the end
+        backfill(self.conn)
+        self.conn.autocommit = True
+        cur = self.conn.cursor()
+        cur.execute("ANALYZE users")
+        cur.execute("ANALYZE user_performance")
+        cur.execute("ANALYZE session_module_rollup")
+        cur.close()
+        self.conn.close()
+
+
+class SQLiteLoader:
+    """Bulk loads with executemany, one chunk per transaction (rollups updated as it goes)"""
+
+    def __init__(self, path):
+        from storage import SQLiteStorage, SQLITE_PRAGMAS
+        self.storage = SQLiteStorage(path)
+        self.conn = sqlite3.connect(path)
+        for pragma in SQLITE_PRAGMAS:
+            self.conn.execute(pragma)
+
+    def load_users(self, rows):
+        first = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM users").fetchone()[0]
+        ids = list(range(first, first + len(rows)))
+        self.conn.executemany("INSERT INTO users (id, email, username, password_hash) VALUES (?, ?, ?, ?)",
+                              [(user_id,) + row for user_id, row in zip(ids, rows)])
+        self.conn.commit()
+        return ids
+
+    def load_performance(self, rows):
+        self.storage.write_performance_rows(rows)
+
+    def finish(self):
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+        self.conn.close()
+
+
+def _rate(count, seconds):
+    return f"{count} rows in {seconds:.1f}s ({count / seconds if seconds > 0 else 0:,.0f} rows/sec)"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed users and performance history for load tests")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--sessions', type=float, default=5, help='mean sessions per user')
+    parser.add_argument('--attempts', type=float, default=4, help='mean attempts per module per session')
+    parser.add_argument('--module-weights', help='comma-separated weights for modules A,B,C,D (default: equal)')
+    parser.add_argument('--score-mean', type=float, default=70)
+    parser.add_argument('--score-sd', type=float, default=15, help='spread of per-user skill')
+    parser.add_argument('--days', type=float, default=180, help='history window ending now')
+    parser.add_argument('--batch-size', type=int, default=50000, help='rows per COPY/transaction')
+    parser.add_argument('--seed', type=int, help='random seed for reproducible datasets')
+    parser.add_argument('--backend', choices=('postgres', 'sqlite'),
+                        default=os.getenv('STORAGE_BACKEND', 'postgres').lower())
+    parser.add_argument('--sqlite-path', default=os.getenv('SQLITE_PATH', 'comms_local.db'))
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    tag = f"{int(time.time())}"
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    # Every seeded user shares one hash (password "password"); hashing per user would dominate the run
+    password_hash = generate_password_hash('password', PASSWORD_HASH_METHOD)
+
+    loader = PostgresLoader() if args.backend == 'postgres' else SQLiteLoader(args.sqlite_path)
+
+    user_count = perf_count = 0
+    user_seconds = perf_seconds = 0.0
+    users_per_chunk = max(1, min(args.batch_size, 10000))
+    for user_rows in _chunks(generate_users(args.users, tag, password_hash), users_per_chunk):
+        started = time.monotonic()
+        user_ids = loader.load_users(user_rows)
+        user_seconds += time.monotonic() - started
+        user_count += len(user_ids)
+
+        for perf_rows in _chunks(generate_performance(user_ids, rng, args, now), args.batch_size):
+            started = time.monotonic()
+            loader.load_performance(perf_rows)
+            perf_seconds += time.monotonic() - started
+            perf_count += len(perf_rows)
+        print(f"  {user_count}/{args.users} users, {perf_count} performance rows", file=sys.stderr)
+
+    started = time.monotonic()
+    loader.finish()
+    finish_seconds = time.monotonic() - started
+
+    print(f"users:            {_rate(user_count, user_seconds)}")
+    print(f"user_performance: {_rate(perf_count, perf_seconds)}")
+    print(f"rollups/analyze:  {finish_seconds:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
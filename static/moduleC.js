@@ -312,26 +312,42 @@ async function submitText(text) {
         isProcessing = true;
         console.log('Submitting text for topic_id:', currentTopicId);
 
-        const response = await fetch('/api/moduleC', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                email: creds.email,
-                session_id: creds.sessionId,
-                topic_id: currentTopicId,
-                transcribed_text: text
-            }),
-            credentials: 'same-origin'
-        });
+        const payload = {
+            email: creds.email,
+            session_id: creds.sessionId,
+            topic_id: currentTopicId,
+            transcribed_text: text
+        };
 
-        if (response.status === 401) {
-            window.location.href = '/login';
-            return;
+        // Prefer the streamed evaluation; fall back to the plain endpoint only if the
+        // server never accepted the stream, otherwise it may already have saved a score
+        const stream = { accepted: false };
+        let result = null;
+        try {
+            result = await submitTextStreaming(payload, text, stream);
+        } catch (streamError) {
+            console.warn('Streaming evaluation failed:', streamError);
         }
 
-        const result = await response.json();
+        if (!result && stream.accepted) {
+            result = { success: false, error: 'The connection dropped before the evaluation finished' };
+        } else if (!result) {
+            const response = await fetch('/api/moduleC', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify(payload),
+                credentials: 'same-origin'
+            });
+
+            if (response.status === 401) {
+                window.location.href = '/login';
+                return;
+            }
+
+            result = await response.json();
+        }
         console.log('Backend response:', result);
 
         if (result.success) {
@@ -348,6 +364,81 @@ async function submitText(text) {
     }
 }
 
+async function submitTextStreaming(payload, text, stream) {
+    const response = await fetch('/api/moduleC/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify(payload),
+        credentials: 'same-origin'
+    });
+
+    if (response.status === 401) {
+        window.location.href = '/login';
+        return null;
+    }
+    if (!response.ok || !response.body) {
+        return null;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let feedback = '';
+    let shown = false;
+
+    const showPartial = () => {
+        if (shown) return;
+        shown = true;
+        document.getElementById('topicResult').textContent = currentTopic || "Unknown Topic";
+        document.getElementById('transcription').textContent = text || "";
+        document.getElementById('score').textContent = '--';
+        document.getElementById('analysis').textContent = '';
+        document.getElementById('strengthsList').innerHTML = '';
+        document.getElementById('improvementsList').innerHTML = '';
+        document.getElementById('results').style.display = 'flex';
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (!data) continue;
+            const message = JSON.parse(data);
+
+            if (event === 'accepted') {
+                stream.accepted = true;
+            } else if (event === 'score') {
+                showPartial();
+                if (message.total_score !== undefined) {
+                    document.getElementById('score').textContent = Math.round(message.total_score);
+                }
+            } else if (event === 'feedback') {
+                showPartial();
+                feedback += message.text;
+                document.getElementById('analysis').textContent = feedback;
+            } else if (event === 'result') {
+                return message;
+            }
+        }
+    }
+    return null;
+}
+
 function displayResults(result) {
     const score = Math.round(result.score || 0);
     document.getElementById('score').textContent = score;
@@ -0,0 +1,400 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import config  # noqa: F401  # loads .env
+
+from db import get_connection, connect, init_pool
+from migrations import migrate_sqlite
+from rollup import aggregate_rows, upsert_rollups
+
+
+class StorageError(Exception):
+    """The backend was unreachable or a query failed"""
+
+
+class IntegrityError(StorageError):
+    """A uniqueness or foreign-key constraint was violated"""
+
+
+class DataError(StorageError):
+    """The database rejected a value (wrong type, out of range); retrying won't help"""
+
+
+class Storage:
+    """Persistence interface used by app.py.
+
+    Methods raise StorageError on failure and leave fallback behaviour
+    (default values, error messages) to the caller.
+
+    Performance rows are (user_id, session_id, module, question_number,
+    score, max_score, timestamp) tuples throughout.
+    """
+
+    name = None
+
+    def create_user(self, email, username, password_hash):
+        raise NotImplementedError
+
+    def get_user(self, email, include_password=False):
+        """User dict (id, email, username[, password_hash]) or None"""
+        raise NotImplementedError
+
+    def update_password_hash(self, user_id, password_hash):
+        raise NotImplementedError
+
+    def write_performance_rows(self, rows):
+        """Insert rows and update their session rollups in one transaction"""
+        raise NotImplementedError
+
+    def user_and_completed(self, email, module):
+        """(user_id, completed question numbers) in one query, or None for unknown emails"""
+        raise NotImplementedError
+
+    def session_report(self, user_id, session_id):
+        """Per-module rows (module, avg_score, max_score, attempts) for one session"""
+        raise NotImplementedError
+
+    def performance_history(self, user_id, module=None, after=None, limit=500):
+        """Up to `limit` rows ordered by (timestamp, id), strictly after the `after` key
+
+        Rows are dicts with id, session_id, module, question_number, score,
+        max_score and timestamp. Keyset pagination keeps every page an index
+        range scan no matter how deep the client has paged.
+        """
+        raise NotImplementedError
+
+    def iter_performance_export(self, start=None, end=None, module=None, chunk_size=5000):
+        """Yield lists of at most `chunk_size` raw user_performance rows, ordered by id
+
+        Rows are (id, user_id, session_id, module, question_number, score,
+        max_score, timestamp) tuples, filtered to start <= timestamp < end.
+        Only one chunk is held in memory at a time.
+        """
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Load drivers and open connections ahead of the first request (optional)"""
+
+
+class PostgresStorage(Storage):
+    """Postgres backend on the shared connection pool (db.py)
+
+    psycopg2 is imported inside the methods, so SQLite deployments never load it.
+    """
+
+    name = 'postgres'
+
+    def warm_up(self):
+        init_pool()
+
+    @contextmanager
+    def _cursor(self, dict_rows=False):
+        import psycopg2
+        from psycopg2.extras import RealDictCursor
+        with get_connection() as conn:
+            if not conn:
+                raise StorageError("Database connection failed")
+            try:
+                cur = conn.cursor(cursor_factory=RealDictCursor) if dict_rows else conn.cursor()
+                yield cur
+                conn.commit()
+                cur.close()
+            except psycopg2.IntegrityError as e:
+                conn.rollback()
+                raise IntegrityError(str(e)) from e
+            except psycopg2.DataError as e:
+                conn.rollback()
+                raise DataError(str(e)) from e
+            except psycopg2.Error as e:
+                conn.rollback()
+                raise StorageError(str(e)) from e
+
+    def create_user(self, email, username, password_hash):
+        with self._cursor() as cur:
+            cur.execute("INSERT INTO users (email, username, password_hash) VALUES (%s, %s, %s)",
+                        (email, username, password_hash))
+
+    def get_user(self, email, include_password=False):
+        columns = "id, email, username, password_hash" if include_password else "id, email, username"
+        with self._cursor(dict_rows=True) as cur:
+            cur.execute(f"SELECT {columns} FROM users WHERE email = %s", (email,))
+            row = cur.fetchone()
+        return dict(row) if row else None
+
+    def update_password_hash(self, user_id, password_hash):
+        with self._cursor() as cur:
+            cur.execute("UPDATE users SET password_hash = %s WHERE id = %s", (password_hash, user_id))
+
+    def write_performance_rows(self, rows):
+        from psycopg2.extras import execute_values
+        with self._cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO user_performance (user_id, session_id, module, question_number, score, max_score, timestamp)
+                VALUES %s
+            """, rows, page_size=max(len(rows), 100))
+            # Keep the report rollups in step within the same transaction
+            upsert_rollups(cur, rows)
+
+    def user_and_completed(self, email, module):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT u.id,
+                       COALESCE(array_agg(DISTINCT p.question_number)
+                                FILTER (WHERE p.question_number IS NOT NULL), '{}')
+                FROM users u
+                LEFT JOIN user_performance p ON p.user_id = u.id AND p.module = %s
+                WHERE u.email = %s
+                GROUP BY u.id
+            """, (module, email))
+            row = cur.fetchone()
+        return (row[0], list(row[1])) if row else None
+
+    def session_report(self, user_id, session_id):
+        with self._cursor(dict_rows=True) as cur:
+            # Per-module aggregates are maintained incrementally in session_module_rollup
+            cur.execute("""
+                SELECT module, score_sum / attempts AS avg_score, max_score_sum / attempts AS max_score, attempts
+                FROM session_module_rollup
+                WHERE user_id = %s AND session_id = %s AND attempts > 0
+                ORDER BY module
+            """, (user_id, session_id))
+            return [dict(row) for row in cur.fetchall()]
+
+    def performance_history(self, user_id, module=None, after=None, limit=500):
+        conditions = ["user_id = %s"]
+        params = [user_id]
+        if module:
+            conditions.append("module = %s")
+            params.append(module)
+        if after:
+            conditions.append("(timestamp, id) > (%s::timestamp, %s)")
+            params.extend(after)
+        with self._cursor(dict_rows=True) as cur:
+            cur.execute(f"""
+                SELECT id, session_id, module, question_number, score, max_score, timestamp
+                FROM user_performance
+                WHERE {' AND '.join(conditions)}
+                ORDER BY timestamp, id
+                LIMIT %s
+            """, params + [limit])
+            return [dict(row) for row in cur.fetchall()]
+
+    def iter_performance_export(self, start=None, end=None, module=None, chunk_size=5000):
+        import psycopg2
+        where, params = _export_filters(start, end, module, '%s')
+        # A dedicated connection keeps long exports from pinning a pool slot
+        try:
+            conn = connect()
+        except (RuntimeError, psycopg2.Error) as e:
+            raise StorageError(str(e)) from e
+        try:
+            conn.set_session(readonly=True)
+            # Named cursor = server-side cursor: rows arrive chunk_size at a time
+            cur = conn.cursor(name='performance_export')
+            cur.itersize = chunk_size
+            cur.execute(f"""
+                SELECT id, user_id, session_id, module, question_number, score, max_score, timestamp
+                FROM user_performance
+                {where}
+                ORDER BY id
+            """, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+            cur.close()
+        except psycopg2.Error as e:
+            raise StorageError(str(e)) from e
+        finally:
+            conn.rollback()
+            conn.close()
+
+
+def _export_filters(start, end, module, placeholder):
+    conditions, params = [], []
+    if start:
+        conditions.append(f"timestamp >= {placeholder}")
+        params.append(start)
+    if end:
+        conditions.append(f"timestamp < {placeholder}")
+        params.append(end)
+    if module:
+        conditions.append(f"module = {placeholder}")
+        params.append(module)
+    return ("WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",        # readers never block the writer
+    "PRAGMA synchronous=NORMAL",      # fsync at checkpoints only; safe with WAL
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA busy_timeout=5000",       # wait for the write lock instead of failing
+    "PRAGMA cache_size=-32000",       # ~32MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+SQLITE_ROLLUP_UPSERT_SQL = """
+    INSERT INTO session_module_rollup (user_id, session_id, module, score_sum, max_score_sum, attempts, best_score)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, session_id, module) DO UPDATE SET
+        score_sum = score_sum + excluded.score_sum,
+        max_score_sum = max_score_sum + excluded.max_score_sum,
+        attempts = attempts + excluded.attempts,
+        best_score = CASE WHEN best_score IS NULL OR excluded.best_score > best_score
+                          THEN excluded.best_score ELSE best_score END,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+class SQLiteStorage(Storage):
+    """Embedded SQLite backend for local development, profiling and load tests.
+
+    Each thread gets its own connection; WAL mode lets request threads read
+    while the write-behind flusher commits. The schema is migrated on open.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        try:
+            migrate_sqlite(conn)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.row_factory = sqlite3.Row
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    @contextmanager
+    def _cursor(self):
+        conn = self._conn()
+        try:
+            cur = conn.cursor()
+            yield cur
+            conn.commit()
+            cur.close()
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            raise IntegrityError(str(e)) from e
+        except (sqlite3.DataError, sqlite3.InterfaceError) as e:
+            # InterfaceError: a parameter of a type SQLite can't bind
+            conn.rollback()
+            raise DataError(str(e)) from e
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise StorageError(str(e)) from e
+
+    def create_user(self, email, username, password_hash):
+        with self._cursor() as cur:
+            cur.execute("INSERT INTO users (email, username, password_hash) VALUES (?, ?, ?)",
+                        (email, username, password_hash))
+
+    def get_user(self, email, include_password=False):
+        columns = "id, email, username, password_hash" if include_password else "id, email, username"
+        with self._cursor() as cur:
+            cur.execute(f"SELECT {columns} FROM users WHERE email = ?", (email,))
+            row = cur.fetchone()
+        return dict(row) if row else None
+
+    def update_password_hash(self, user_id, password_hash):
+        with self._cursor() as cur:
+            cur.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+
+    def write_performance_rows(self, rows):
+        with self._cursor() as cur:
+            cur.executemany("""
+                INSERT INTO user_performance (user_id, session_id, module, question_number, score, max_score, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            cur.executemany(SQLITE_ROLLUP_UPSERT_SQL, aggregate_rows(rows))
+
+    def user_and_completed(self, email, module):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT u.id, group_concat(DISTINCT p.question_number)
+                FROM users u
+                LEFT JOIN user_performance p ON p.user_id = u.id AND p.module = ?
+                WHERE u.email = ?
+                GROUP BY u.id
+            """, (module, email))
+            row = cur.fetchone()
+        if not row:
+            return None
+        completed = [int(n) for n in row[1].split(',')] if row[1] else []
+        return row[0], completed
+
+    def session_report(self, user_id, session_id):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT module, score_sum / attempts AS avg_score, max_score_sum / attempts AS max_score, attempts
+                FROM session_module_rollup
+                WHERE user_id = ? AND session_id = ? AND attempts > 0
+                ORDER BY module
+            """, (user_id, session_id))
+            return [dict(row) for row in cur.fetchall()]
+
+    def performance_history(self, user_id, module=None, after=None, limit=500):
+        conditions = ["user_id = ?"]
+        params = [user_id]
+        if module:
+            conditions.append("module = ?")
+            params.append(module)
+        if after:
+            conditions.append("(timestamp, id) > (?, ?)")
+            params.extend(after)
+        with self._cursor() as cur:
+            cur.execute(f"""
+                SELECT id, session_id, module, question_number, score, max_score, timestamp
+                FROM user_performance
+                WHERE {' AND '.join(conditions)}
+                ORDER BY timestamp, id
+                LIMIT ?
+            """, params + [limit])
+            return [dict(row) for row in cur.fetchall()]
+
+
+    def iter_performance_export(self, start=None, end=None, module=None, chunk_size=5000):
+        where, params = _export_filters(start, end, module, '?')
+        # Separate connection so a slow consumer never holds this thread's transaction open
+        conn = self._connect()
+        try:
+            cur = conn.execute(f"""
+                SELECT id, user_id, session_id, module, question_number, score, max_score, timestamp
+                FROM user_performance
+                {where}
+                ORDER BY id
+            """, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [tuple(row) for row in rows]
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+        finally:
+            conn.close()
+
+def get_storage():
+    """Build the backend selected by STORAGE_BACKEND (postgres | sqlite)"""
+    backend = os.getenv('STORAGE_BACKEND', 'postgres').lower()
+    if backend == 'sqlite':
+        return SQLiteStorage(os.getenv('SQLITE_PATH', 'comms_local.db'))
+    if backend == 'postgres':
+        return PostgresStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
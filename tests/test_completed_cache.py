@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from completed_cache import (MAX_INDEX, CompletedSetCache, mask_to_indices, random_unseen, sample_unseen,
+                             to_mask)
+
+
+def test_to_mask_ignores_invalid_entries():
+    assert to_mask([0, 3, "5", None, "x", -1, MAX_INDEX, 3]) == 0b101001
+
+
+def test_mask_round_trip():
+    assert mask_to_indices(to_mask([7, 0, 64, 2])) == [0, 2, 7, 64]
+
+
+def test_random_unseen_only_returns_unseen_indices():
+    rng = random.Random(1)
+    mask = to_mask(range(20)) & ~to_mask([4, 17])
+    assert {random_unseen(mask, 20, rng) for _ in range(200)} == {4, 17}
+
+
+def test_random_unseen_with_a_single_gap():
+    rng = random.Random(2)
+    mask = to_mask(i for i in range(100) if i != 63)
+    assert all(random_unseen(mask, 100, rng) == 63 for _ in range(50))
+
+
+def test_random_unseen_falls_back_to_the_whole_bank_when_all_seen():
+    rng = random.Random(3)
+    picks = {random_unseen(to_mask(range(5)), 5, rng) for _ in range(200)}
+    assert picks == set(range(5))
+
+
+def test_bits_beyond_the_bank_do_not_count_as_seen():
+    rng = random.Random(4)
+    assert random_unseen(to_mask([0, 1, 9]), 3, rng) == 2
+
+
+def test_sample_unseen_returns_distinct_unseen_indices():
+    rng = random.Random(5)
+    picks = sample_unseen(to_mask([0, 1, 2]), 10, 5, rng)
+    assert len(picks) == len(set(picks)) == 5
+    assert not set(picks) & {0, 1, 2}
+
+
+def test_sample_unseen_returns_fewer_when_few_are_left():
+    assert sorted(sample_unseen(to_mask(range(8)), 10, 5, random.Random(6))) == [8, 9]
+
+
+def test_sample_unseen_uses_the_whole_bank_when_all_seen():
+    picks = sample_unseen(to_mask(range(10)), 10, 5, random.Random(7))
+    assert len(set(picks)) == 5
+    assert set(picks) <= set(range(10))
+
+
+@pytest.mark.parametrize("size", [1, 23])
+def test_sample_unseen_never_asks_for_more_than_the_bank(size):
+    assert len(sample_unseen(0, size, 50, random.Random(8))) == size
+
+
+def test_cache_marks_are_ored_into_loaded_entries():
+    cache = CompletedSetCache()
+    assert cache.get(1, "A") is None
+    cache.load(1, "A", [0, 2])
+    cache.mark(1, "A", [5])
+    assert mask_to_indices(cache.get(1, "A")) == [0, 2, 5]
+
+
+def test_marks_made_before_the_first_load_survive_it():
+    cache = CompletedSetCache()
+    cache.mark(1, "A", [3])
+    assert cache.get(1, "A") is None
+    assert mask_to_indices(cache.load(1, "A", [1])) == [1, 3]
@@ -0,0 +1,67 @@
+import pytest
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+
+import hashing
+from hashing import needs_rehash
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    def set_policy(method, upgrade_from=()):
+        monkeypatch.setattr(hashing, "PASSWORD_HASH_METHOD", method)
+        monkeypatch.setattr(hashing, "PASSWORD_HASH_UPGRADE_FROM", set(upgrade_from))
+    return set_policy
+
+
+@pytest.mark.parametrize("stored, expected", [
+    ("scrypt:32768:8:1$salt$hash", False),
+    ("scrypt$salt$hash", False),                 # Werkzeug's defaults spelled implicitly
+    ("scrypt:16384:8:1$salt$hash", True),        # weaker N
+    ("scrypt:32768:4:1$salt$hash", True),        # weaker r
+    ("scrypt:65536:8:1$salt$hash", False),       # stronger than the policy: never downgraded
+    ("pbkdf2:sha256:600000$salt$hash", False),   # other algorithm, not listed for upgrade
+])
+def test_scrypt_policy(policy, stored, expected):
+    policy("scrypt:32768:8:1")
+    assert needs_rehash(stored) is expected
+
+
+@pytest.mark.parametrize("stored, expected", [
+    ("pbkdf2:sha256:600000$salt$hash", True),
+    (f"pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}$salt$hash", False),
+    ("pbkdf2:sha256$salt$hash", False),          # iterations default to Werkzeug's
+    ("pbkdf2$salt$hash", False),                 # hash name defaults to sha256
+    ("pbkdf2:sha256:2000000$salt$hash", False),
+    ("pbkdf2:sha512:1$salt$hash", False),        # different hash, not listed for upgrade
+    ("scrypt:32768:8:1$salt$hash", False),
+])
+def test_pbkdf2_policy(policy, stored, expected):
+    policy(f"pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}")
+    assert needs_rehash(stored) is expected
+
+
+@pytest.mark.parametrize("upgrade_from, stored, expected", [
+    ({"pbkdf2"}, "pbkdf2:sha256:600000$salt$hash", True),
+    ({"pbkdf2"}, "pbkdf2:sha512:9000000$salt$hash", True),
+    ({"pbkdf2:sha1"}, "pbkdf2:sha256:600000$salt$hash", False),
+    ({"pbkdf2:sha1"}, "pbkdf2:sha1:600000$salt$hash", True),
+])
+def test_explicit_algorithm_upgrades(policy, upgrade_from, stored, expected):
+    policy("scrypt:32768:8:1", upgrade_from)
+    assert needs_rehash(stored) is expected
+
+
+@pytest.mark.parametrize("stored", ["", "garbage", "scrypt:abc:8:1$salt$hash", "pbkdf2:sha256:lots$s$h"])
+def test_unparseable_hashes_are_left_alone(policy, stored):
+    policy("scrypt:32768:8:1")
+    assert needs_rehash(stored) is False
+
+
+def test_verify_upgrades_a_weaker_hash_inline(policy, monkeypatch):
+    monkeypatch.setattr(hashing, "HASH_WORKERS", 0)
+    policy("pbkdf2:sha256:2000")
+    weak = hashing.generate_password_hash("secret", "pbkdf2:sha256:1000")
+    assert hashing.verify_password(weak, "wrong") == (False, None)
+    valid, upgraded = hashing.verify_password(weak, "secret")
+    assert valid and upgraded.startswith("pbkdf2:sha256:2000$")
+    assert hashing.verify_password(upgraded, "secret") == (True, None)
@@ -0,0 +1,78 @@
+import pytest
+
+from llm_json import IncrementalJSONParser, extract_json
+
+
+def feed_all(text, step=1):
+    parser = IncrementalJSONParser()
+    partials = [parser.feed(text[i:i + step]) for i in range(0, len(text), step)]
+    return parser, partials
+
+
+def test_complete_object_inside_fences_and_prose():
+    text = 'Here you go:\n```json\n{"score": 7, "tags": ["a", "b"]}\n```\nThanks!'
+    assert extract_json(text) == {"score": 7, "tags": ["a", "b"]}
+
+
+def test_partials_only_grow_while_streaming():
+    text = '{"accuracy_score": 30, "feedback": "Nice work", "strengths": ["pace"]}'
+    parser, partials = feed_all(text)
+    assert partials[0] == {}
+    assert {"accuracy_score": 30} in partials
+    assert {"accuracy_score": 30, "feedback": "Nice"} in partials
+    assert partials[-1] == parser.result() == {
+        "accuracy_score": 30, "feedback": "Nice work", "strengths": ["pace"]}
+
+
+def test_number_is_not_reported_until_it_is_finished():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": 1') == {}
+    assert parser.feed('2,') == {"a": 12}
+
+
+def test_prefix_ending_in_an_escape_is_held_back():
+    parser = IncrementalJSONParser()
+    parser.feed('{"feedback": "say \\"hi')
+    assert parser.partial() == {"feedback": 'say "hi'}
+    assert parser.feed('\\') == {"feedback": 'say "hi'}
+    assert parser.feed('u00e9') == {"feedback": 'say "hié'}
+
+
+def test_half_written_unicode_escape():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": "x\\u00') == {"a": "x"}
+
+
+def test_brackets_and_quotes_inside_strings_are_text():
+    text = '{"feedback": "use [brackets] and {braces}, \\"quotes\\"", "n": 1}'
+    assert extract_json(text) == {"feedback": 'use [brackets] and {braces}, "quotes"', "n": 1}
+
+
+def test_trailing_commas_are_dropped_only_outside_strings():
+    text = '{"feedback": "good, }job", "list": [1, 2, ], "end": "a,]", }'
+    assert extract_json(text) == {"feedback": "good, }job", "list": [1, 2], "end": "a,]"}
+
+
+def test_truncated_output_falls_back_to_the_partial_object():
+    assert extract_json('{"score": 5, "feedback": "Well do') == {"score": 5, "feedback": "Well do"}
+
+
+def test_partial_key_is_not_reported():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"score": 5, "feedb') == {"score": 5}
+
+
+def test_top_level_array():
+    assert extract_json('[{"a": 1}, {"a": 2}]') == [{"a": 1}, {"a": 2}]
+
+
+def test_text_after_the_object_is_ignored():
+    parser, _ = feed_all('{"a": 1} and then {"b": 2}', step=4)
+    assert parser.complete
+    assert parser.result() == {"a": 1}
+
+
+@pytest.mark.parametrize("text", ["", "no json here", None])
+def test_nothing_object_like_raises(text):
+    with pytest.raises(ValueError):
+        extract_json(text)
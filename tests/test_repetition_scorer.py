@@ -0,0 +1,82 @@
+import pytest
+
+import repetition_scorer
+from repetition_scorer import score_repetition, estimate_repetition, align
+
+TARGET = "The quick brown fox jumps over the lazy dog."
+
+
+def test_perfect_reading_is_scored_locally():
+    result = score_repetition("the quick brown fox jumps over the lazy dog", TARGET)
+    assert result["word_error_rate"] == 0
+    assert result["accuracy_score"] == 40
+    assert result["total_score"] == 100
+    assert result["improvements"] == []
+
+
+def test_one_word_off_in_a_long_sentence_still_passes():
+    target = "one two three four five six seven eight nine ten eleven"
+    result = score_repetition("one two three four five six seven eight nine ten twelve", target)
+    assert result is not None
+    assert result["improvements"] == ["Watch these words: eleven."]
+
+
+def test_repeated_sentence_goes_to_the_llm():
+    assert score_repetition(f"{TARGET} {TARGET}", TARGET) is None
+
+
+def test_padded_reading_goes_to_the_llm():
+    padded = "um so okay the quick brown fox uh jumps over the lazy dog I think yeah right"
+    assert score_repetition(padded, TARGET) is None
+
+
+def test_empty_attempt_fails_locally():
+    result = score_repetition("", TARGET)
+    assert result["total_score"] == 0
+    assert "couldn't hear" in result["feedback"]
+
+
+def test_unrelated_attempt_fails_locally():
+    result = score_repetition("hello there", TARGET)
+    assert result is not None
+    assert result["fluency_score"] == 0
+    assert "didn't match" in result["feedback"]
+
+
+def test_partial_reading_goes_to_the_llm():
+    assert score_repetition("the quick brown fox jumps", TARGET) is None
+
+
+def test_mostly_missed_reading_fails_locally():
+    # 2 of 9 words read: 7/9 missed is below the threshold, 8/9 is above it
+    assert score_repetition("the quick", TARGET) is None
+    result = score_repetition("quick", TARGET)
+    assert result["accuracy_score"] == round(40 / 9)
+
+
+def test_thresholds_come_from_module_settings(monkeypatch):
+    monkeypatch.setattr(repetition_scorer, "FAST_PASS_WER", 0.0)
+    target = "one two three four five six seven eight nine ten eleven"
+    assert score_repetition("one two three four five six seven eight nine ten twelve", target) is None
+
+
+def test_pace_tip_is_added_for_slow_speech():
+    result = score_repetition(TARGET, TARGET, {"wps": 0.75, "duration": 12})
+    assert result["fluency_score"] == 15
+    assert "faster" in result["feedback"]
+
+
+@pytest.mark.parametrize("hypothesis, expected", [
+    (("a", "b", "c"), (0, 0, 0, [])),
+    (("a", "x", "c"), (1, 0, 0, ["b"])),
+    (("a", "c"), (0, 1, 0, ["b"])),
+    (("a", "b", "b", "c"), (0, 0, 1, [])),
+])
+def test_align_counts_each_edit(hypothesis, expected):
+    assert align(("a", "b", "c"), hypothesis) == expected
+
+
+def test_estimate_caps_error_rate_at_one():
+    result = estimate_repetition("completely different words entirely here now ok", "short one")
+    assert result["word_error_rate"] == 1.0
+    assert result["total_score"] == 0
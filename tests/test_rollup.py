@@ -0,0 +1,33 @@
+from rollup import aggregate_rows
+
+
+def test_rows_collapse_to_one_delta_per_session_module():
+    rows = [
+        (1, "s1", "Module A", 0, 80, 100, "2024-01-01 10:00:00"),
+        (1, "s1", "Module A", 1, 60, 100, "2024-01-01 10:01:00"),
+        (1, "s1", "Module D", 2, 1, 1, "2024-01-01 10:02:00"),
+        (2, "s1", "Module A", 0, 90, 100, "2024-01-01 10:03:00"),
+    ]
+    assert aggregate_rows(rows) == [
+        (1, "s1", "Module A", 140.0, 200.0, 2, 80),
+        (1, "s1", "Module D", 1.0, 1.0, 1, 1),
+        (2, "s1", "Module A", 90.0, 100.0, 1, 90),
+    ]
+
+
+def test_output_is_sorted_for_a_consistent_lock_order():
+    rows = [(2, "b", "M", 0, 1, 1), (1, "z", "M", 0, 1, 1), (1, "a", "M", 0, 1, 1)]
+    assert [delta[:2] for delta in aggregate_rows(rows)] == [(1, "a"), (1, "z"), (2, "b")]
+
+
+def test_missing_scores_count_as_attempts_but_not_as_best():
+    rows = [(1, "s", "M", 0, None, None), (1, "s", "M", 1, 0, 10)]
+    assert aggregate_rows(rows) == [(1, "s", "M", 0.0, 10.0, 2, 0)]
+
+
+def test_all_missing_scores_leave_best_unset():
+    assert aggregate_rows([(1, "s", "M", 0, None, 10)]) == [(1, "s", "M", 0.0, 10.0, 1, None)]
+
+
+def test_no_rows_no_deltas():
+    assert aggregate_rows([]) == []
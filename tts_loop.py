@@ -0,0 +1,82 @@
+import os
+import asyncio
+import threading
+
+import metrics
+
+# One long-lived event loop for Edge TTS, shared by every request thread. This
+# module is imported lazily so processes that never synthesize audio don't
+# load asyncio.
+
+TTS_RENDER_COALESCED = metrics.Counter('tts_render_coalesced_total',
+                                       'Audio requests that joined a synthesis already in flight for the same file')
+
+
+class BackgroundLoop:
+    """An asyncio loop running forever on a daemon thread; run() blocks the caller until a coroutine finishes"""
+
+    def __init__(self, name='tts-loop'):
+        self.name = name
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure(self):
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule coro on the loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure())
+
+    def run(self, coro, timeout=None):
+        """Run coro on the loop and wait for its result.
+
+        On timeout the coroutine keeps running, so a slow synthesis still lands
+        on disk for the next request.
+        """
+        return self.submit(coro).result(timeout)
+
+    def reset(self):
+        # The loop thread doesn't survive fork; the child starts a fresh one on first use
+        self._loop = None
+        self._lock = threading.Lock()
+
+
+class AsyncSingleFlight:
+    """Coalesce concurrent awaits of the same key onto one task (loop-thread only)"""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            TTS_RENDER_COALESCED.inc()
+        # Shielded so one caller giving up doesn't cancel the render for the others
+        return await asyncio.shield(task)
+
+    def reset(self):
+        self._inflight = {}
+
+
+tts_loop = BackgroundLoop()
+inflight_renders = AsyncSingleFlight()
+
+
+def _reset_after_fork():
+    tts_loop.reset()
+    inflight_renders.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+import config  # noqa: F401  # loads .env
+from moduleB import (sentences, TTS_VOICE, TTS_RATE, TTS_PITCH, AUDIO_FOLDER, audio_cache,
+                     audio_cache_key, render_audio, resolve_voice, resolve_rate)
+from tts_loop import tts_loop
+
+TTS_CONCURRENCY = int(os.getenv('TTS_CONCURRENCY', '4'))
+
+
+def missing_audio(voices, rates, force=False):
+    """(sentence_id, voice, rate) for every rendering not in the audio cache, and how many were skipped"""
+    pending, skipped = [], 0
+    for voice in voices:
+        for rate in rates:
+            for sentence_id, sentence in enumerate(sentences):
+                if not force and audio_cache.contains(audio_cache_key(sentence, voice, rate, TTS_PITCH)):
+                    skipped += 1
+                else:
+                    pending.append((sentence_id, voice, rate))
+    return pending, skipped
+
+
+async def _render_all(pending, concurrency, force=False):
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def render(sentence_id, voice, rate):
+        async with semaphore:
+            key = await render_audio(sentences[sentence_id], voice, rate, TTS_PITCH, force)
+            return os.path.getsize(audio_cache.path_for(key))
+
+    return await asyncio.gather(*(render(*item) for item in pending), return_exceptions=True)
+
+
+def pregenerate(voices=None, rates=None, concurrency=TTS_CONCURRENCY, force=False):
+    """Render every missing (sentence, voice, rate) MP3 concurrently.
+
+    Returns a summary dict: rendered, skipped, failed (list of (sentence_id,
+    voice, rate, error)), bytes and seconds.
+    """
+    os.makedirs(AUDIO_FOLDER, exist_ok=True)
+    voices = [resolve_voice(voice) for voice in voices or [TTS_VOICE]]
+    rates = [resolve_rate(rate) for rate in rates or [TTS_RATE]]
+    pending, skipped = missing_audio(voices, rates, force)
+    started = time.monotonic()
+    # Same loop and single-flight as request-time renders, so the two never duplicate work
+    outcomes = tts_loop.run(_render_all(pending, concurrency, force)) if pending else []
+    seconds = time.monotonic() - started
+
+    rendered, total_bytes, failed = 0, 0, []
+    for (sentence_id, voice, rate), outcome in zip(pending, outcomes):
+        if isinstance(outcome, BaseException):
+            failed.append((sentence_id, voice, rate, str(outcome) or type(outcome).__name__))
+        else:
+            rendered += 1
+            total_bytes += outcome
+    return {'rendered': rendered, 'skipped': skipped, 'failed': failed,
+            'bytes': total_bytes, 'seconds': seconds}
+
+
+def report(summary):
+    seconds = summary['seconds']
+    throughput = summary['rendered'] / seconds if seconds else 0.0
+    print(f"TTS pre-generation: {summary['rendered']} rendered, {summary['skipped']} already valid, "
+          f"{len(summary['failed'])} failed in {seconds:.1f}s "
+          f"({throughput:.1f} files/s, {summary['bytes'] / 1024:.0f} KiB)")
+    for sentence_id, voice, rate, error in summary['failed']:
+        print(f"  failed: sentence {sentence_id} ({voice}, {rate}): {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render Module B sentence audio ahead of time with Edge TTS")
+    parser.add_argument('--voice', action='append', dest='voices',
+                        help=f'Edge TTS voice; repeat for several (default: {TTS_VOICE})')
+    parser.add_argument('--rate', action='append', dest='rates',
+                        help=f'speaking rate such as -15%%; repeat for several (default: {TTS_RATE.replace("%", "%%")})')
+    parser.add_argument('--concurrency', type=int, default=TTS_CONCURRENCY, help='syntheses in flight at once')
+    parser.add_argument('--force', action='store_true', help='re-render files that are already valid')
+    args = parser.parse_args(argv)
+
+    try:
+        summary = pregenerate(args.voices, args.rates, args.concurrency, args.force)
+    except ValueError as e:
+        parser.error(str(e))
+    report(summary)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())